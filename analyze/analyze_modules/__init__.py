@@ -1,4 +1,5 @@
 from .data_loader import ChelioRun, load_parameter_sweep, load_parameter_matrix
+from .summary import load_summary, summary_matrix
 from .plot_utils import (
     plot_profile,
     plot_profile_comparison,
@@ -12,6 +13,8 @@ __all__ = [
     "ChelioRun",
     "load_parameter_sweep",
     "load_parameter_matrix",
+    "load_summary",
+    "summary_matrix",
     "plot_profile",
     "plot_profile_comparison",
     "plot_all_iteration_profiles",
@@ -0,0 +1,193 @@
+import numpy as np
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+from typing import Dict, Any, List, Optional
+
+from .run_cache import run_files
+from .iterations import parse_iterations, n_consecutive
+
+# Catalog (index) of the runs in an output directory, saved as
+# <output dir>/chelio_catalog.json.
+#
+# Run directory names are parsed into parameters, e.g.
+#   Earth_P0=1e6_Tint=100_NoCond_CplusO=1e-3_CtoO=0.59_test
+#   -> planet 'Earth', {'P0': 1e6, 'Tint': 100, 'CplusO': 1e-3, 'CtoO': 0.59}, noCond, add '_test'
+# so runs are found by parameter value, whether their names were built from the
+# raw option strings (run_grid.py, multiple_runs.bash) or the formatted ones
+# (_build_run_name in data_loader.py). For each run the catalog also records the
+# number of iterations, the convergence status and key scalars. Rebuilding only
+# re-reads runs whose output files changed; the file is only rewritten if
+# something changed (and kept in memory if the directory is not writable).
+#
+# Usage:
+#   cd analyze && python3 -m analyze_modules.catalog ../output/grid
+
+CATALOG_FILE = 'chelio_catalog.json'
+CATALOG_VERSION = 1
+
+
+def parse_run_name(run_name: str) -> Optional[Dict[str, Any]]:
+    """Parameters of a run directory name; None if it is not a run name."""
+    tokens = run_name.split('_')
+    planet, params, no_cond, add = tokens[0], {}, False, []
+    for token in tokens[1:]:
+        key, sep, value = token.partition('=')
+        if sep and not add:
+            try:
+                params[key] = float(value)
+                continue
+            except ValueError:
+                pass
+        if token == 'NoCond' and not add:
+            no_cond = True
+        else:
+            add.append(token)
+    if not params:
+        return None
+    return {'planet': planet, 'params': params, 'noCond': no_cond, 'add': ''.join('_' + t for t in add)}
+
+
+def run_key(parsed: Dict[str, Any]) -> str:
+    """Canonical lookup key of parsed run parameters (values to 6 significant digits)."""
+    values = ','.join(f'{k}={v:.6g}' for k, v in sorted(parsed['params'].items()))
+    return f"{parsed['planet']}|{values}|{int(parsed['noCond'])}|{parsed['add']}"
+
+
+def _catalog_entry(base_folder: Path, run_name: str, parsed: Dict[str, Any], signature: str) -> Dict[str, Any]:
+    from .data_loader import ChelioRun
+
+    files = [name for name, _, _ in run_files(base_folder / run_name, run_name)]
+    n_iterations = n_consecutive(parse_iterations(files).static_conc)
+
+    entry = dict(parsed, name=run_name, signature=signature, n_iterations=n_iterations, converged=False,
+                 n_layers=0, T_surf=np.nan, T_TOA=np.nan, escape_time_yrs=np.nan)
+    if n_iterations == 0:
+        return entry
+
+    # only pressure and temperature of the last iteration are read
+    run = ChelioRun(base_folder, run_name, load_mode='last', lazy=True)
+    run.read_data()
+    entry.update(converged=bool(run.final_convergence_status), n_layers=int(run.n_layers),
+                 escape_time_yrs=float(run.escape_time_yrs))
+    if run.final_convergence_status:
+        entry.update(T_surf=float(run.temperatures_K[0, 0]), T_TOA=float(run.temperatures_K[0, -1]))
+    return entry
+
+
+def build_catalog(base_folder: str or Path, verbose: bool = False) -> Dict[str, Any]:
+    """Scans base_folder once, updates and saves its catalog. Unchanged runs are not read again."""
+    base_folder = Path(base_folder)
+    old = _read_catalog_file(base_folder) or {'runs': []}
+    old_runs = {entry['name']: entry for entry in old['runs']}
+
+    runs = []
+    n_read = 0
+    n_old = len(old_runs)
+    for item in sorted(os.scandir(base_folder), key=lambda item: item.name):
+        if not item.is_dir():
+            continue
+        parsed = parse_run_name(item.name)
+        if parsed is None:
+            continue
+        signature = hashlib.sha256(json.dumps(run_files(item.path, item.name)).encode()).hexdigest()[:16]
+        entry = old_runs.get(item.name)
+        if entry is None or entry['signature'] != signature:
+            entry = _catalog_entry(base_folder, item.name, parsed, signature)
+            n_read += 1
+        runs.append(entry)
+
+    catalog = {'version': CATALOG_VERSION, 'runs': runs}
+    if n_read > 0 or len(runs) != n_old or 'version' not in old:
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=base_folder, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(catalog, f, indent=1)
+            os.replace(tmp_path, base_folder / CATALOG_FILE)
+        except OSError: # e.g. read-only or shared output directory: use the catalog in memory
+            if verbose:
+                print(f'Catalog of {base_folder} could not be saved, using it in memory only.')
+    if verbose:
+        print(f'Catalog of {base_folder}: {len(runs)} runs, {n_read} (re)read, '
+              f'{sum(entry["converged"] for entry in runs)} converged.')
+    return _index(catalog)
+
+
+def _read_catalog_file(base_folder: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(base_folder / CATALOG_FILE, 'r') as f:
+            catalog = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return catalog if catalog.get('version') == CATALOG_VERSION else None
+
+
+def _index(catalog: Dict[str, Any]) -> Dict[str, Any]:
+    catalog['index'] = {run_key(entry): entry for entry in catalog['runs']}
+    return catalog
+
+
+def load_catalog(base_folder: str or Path, update: bool = False) -> Dict[str, Any]:
+    """
+    Catalog of base_folder; built if there is none yet. With update=True, it is brought
+    up to date first (only runs whose output files changed are read again); without,
+    runs added or finished after it was written are missing or outdated.
+    """
+    base_folder = Path(base_folder)
+    catalog = None if update else _read_catalog_file(base_folder)
+    if catalog is None:
+        return build_catalog(base_folder)
+    return _index(catalog)
+
+
+def find_run(catalog: Dict[str, Any], run_name: str) -> Optional[Dict[str, Any]]:
+    """Catalog entry of the run with the same parameters as run_name (in any formatting), or None."""
+    parsed = parse_run_name(run_name)
+    if parsed is None:
+        return None
+    return catalog['index'].get(run_key(parsed))
+
+
+def find_runs(base_folder: str or Path, run_names: List[str], refresh: bool = False) -> List[Optional[Dict[str, Any]]]:
+    """
+    Catalog entries of several runs (None for runs that do not exist). The existing
+    catalog is used as is unless refresh=True; it is updated once if a run is not in it
+    (e.g. a run added after it was written). Entries only serve to find the run
+    directories, their convergence status may be outdated.
+    """
+    catalog = load_catalog(base_folder, update=refresh)
+    entries = [find_run(catalog, name) for name in run_names]
+    if not refresh and any(entry is None for entry in entries):
+        catalog = build_catalog(base_folder)
+        entries = [find_run(catalog, name) for name in run_names]
+    return entries
+
+
+def select_runs(catalog: Dict[str, Any], converged: Optional[bool] = None, **params) -> List[Dict[str, Any]]:
+    """Catalog entries matching the given parameter values (e.g. P0=1e6, planet='Earth')."""
+    selected = []
+    for entry in catalog['runs']:
+        if converged is not None and entry['converged'] != converged:
+            continue
+        match = True
+        for key, value in params.items():
+            if key in ('planet', 'noCond', 'add'):
+                match = entry[key] == value
+            else:
+                match = key in entry['params'] and np.isclose(entry['params'][key], float(value), rtol=1e-5)
+            if not match:
+                break
+        if match:
+            selected.append(entry)
+    return selected
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build or update the catalog of an output directory.')
+    parser.add_argument('base_folder', type=str, help='Output directory containing the run directories')
+    args = parser.parse_args()
+
+    build_catalog(args.base_folder, verbose=True)
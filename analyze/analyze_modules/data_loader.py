@@ -1,8 +1,13 @@
 import numpy as np
 from pathlib import Path
 import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from typing import Dict, Any, List
 
+from . import run_cache
+from .iterations import scan_iterations, last_iteration, n_consecutive
+from .ggchem_io import read_table, read_header
+
 # Utility functions for formatting run names, adapted from notebooks
 def _format_e_nums(num):
     """Formats a number in scientific notation consistent with run names."""
@@ -35,11 +40,80 @@ def _build_run_name(params: Dict[str, Any]) -> str:
     
     return f"{planet}_P0={_format_e_nums(p0)}_Tint={tint}{nocond_str}_CplusO={_format_e_nums(cpluso)}_CtoO={_format_CtoO_float(ctoo)}{add}"
 
+def _read_table(path: Path, skiprows: int, usecols=None) -> np.ndarray:
+    """
+    Reads the data block of a text output file, preferring its memory-mapped binary
+    sidecar (see source/ggchem_io.py).
+    """
+    return read_table(path, skiprows, usecols=usecols)[1]
+
+def _rescale_altitudes(z_ref: np.ndarray, T_ref: np.ndarray, mu_ref: np.ndarray, T: np.ndarray, mu: np.ndarray) -> np.ndarray:
+    """
+    Hydrostatic altitudes of a profile T, mu on the pressure grid of the HELIOS altitudes
+    z_ref (computed for T_ref, mu_ref): each layer thickness scales with the scale height T/mu.
+    """
+    ratio = (T / mu) / (T_ref / mu_ref)
+    dz = np.diff(z_ref) * (ratio[:-1] + ratio[1:]) / 2
+    return z_ref[0] + np.concatenate(([0.], np.cumsum(dz)))
+
+def _interp_log_p(P_new: np.ndarray, P_old: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Profile on the pressure grid P_new, linear in log(P) (constant beyond the ends)."""
+    order = np.argsort(P_old)
+    return np.interp(np.log10(P_new), np.log10(P_old[order]), values[order])
+
+def _exp10_shifted(raw: np.ndarray, shift, dtype=np.float64, in_place: bool = False, out: np.ndarray = None) -> np.ndarray:
+    """
+    10**(raw - shift) as dtype; written into out if given, else into the buffer of raw
+    if in_place (and it is writeable).
+    """
+    if out is None:
+        if in_place and raw.dtype == dtype and raw.flags.writeable:
+            out = raw
+        else:
+            out = np.empty(raw.shape, dtype=dtype)
+    np.subtract(raw, shift, out=out, casting='same_kind')
+    return np.power(10, out, out=out, casting='same_kind')
+
+def _gas_mixing_ratios(atoms_raw: np.ndarray, mols_raw: np.ndarray, dtype=np.float64, in_place: bool = False, out=(None, None)):
+    """
+    log10(n_tot) and the atomic and molecular VMRs from log10 number densities. The sum is
+    a log-sum-exp (shifted by the maximum of each layer), each array is exponentiated once.
+    """
+    shift = np.max(atoms_raw, axis=-1, keepdims=True)
+    if mols_raw.shape[-1] > 0:
+        np.maximum(shift, np.max(mols_raw, axis=-1, keepdims=True), out=shift)
+    atoms_vmr = _exp10_shifted(atoms_raw, shift, dtype, in_place, out[0])
+    mols_vmr = _exp10_shifted(mols_raw, shift, dtype, in_place, out[1])
+    total = np.sum(atoms_vmr, axis=-1, keepdims=True, dtype=np.float64) \
+        + np.sum(mols_vmr, axis=-1, keepdims=True, dtype=np.float64)
+    atoms_vmr /= total
+    mols_vmr /= total
+    return shift + np.log10(total), atoms_vmr, mols_vmr
+
+def _normalized_mixing_ratios(raw: np.ndarray, dtype=np.float64, in_place: bool = False, out: np.ndarray = None) -> np.ndarray:
+    """10**raw normalized to a sum of 1 over the last axis (e.g. elemental abundances)."""
+    mr = _exp10_shifted(raw, np.max(raw, axis=-1, keepdims=True), dtype, in_place, out)
+    mr /= np.sum(mr, axis=-1, keepdims=True, dtype=np.float64)
+    return mr
+
 class ChelioRun:
     """
     Represents a single Chelio simulation run, handling data loading and processing.
     """
-    def __init__(self, output_folder_path: str or Path, run_name: str, load_mode: str = 'last'):
+    # Quantities that a lazy run reads on first access (see __getattr__)
+    _raw_names = ['pressures_bar', 'temperatures_K', 'nHtots', 'atoms_raw', 'mols_raw', 'supersats', 'dusts_raw',
+                  'eps_atoms_raw', 'dust_to_gas_raw', 'dust_vol', 'mus', 'altitudes_cm', 'convective_flags']
+    _converted_names = ['n_tots', 'atoms_vmr', 'mols_vmr', 'dusts_vmr', 'eps_atoms_mr', 'dust_to_gas_mr']
+
+    def __init__(self, output_folder_path: str or Path, run_name: str, load_mode: str = 'last', lazy: bool = False,
+                 cache_dir: str or Path = None, cache_size: float = 2000):
+        """
+        With lazy=True, read_data() only reads the header and what is needed for the
+        convergence check; all other quantities are read on first access, and only
+        the columns they need (see get_species_profile for single species).
+        With a cache_dir, parsed arrays are kept on disk (see run_cache.py) and reused
+        as long as the output files of the run are unchanged; cache_size in MB.
+        """
         if not isinstance(output_folder_path, Path):
             output_folder_path = Path(output_folder_path)
             
@@ -47,6 +121,13 @@ class ChelioRun:
         self.run_name = run_name
         self.run_path = self.output_folder_path / self.run_name
         self.load_mode = load_mode
+        self.lazy = lazy
+        self._lazy_indices = None # iterations still to be read on access (lazy mode)
+        self._dropped_raw = set() # raw arrays dropped by convert_to_vmr(in_place=True)
+        self._n_columns = 0
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        self._cache_entry = None
 
         # Attributes to be populated by read_data()
         self.n_elem = None
@@ -86,17 +167,19 @@ class ChelioRun:
 
     def read_data(self):
         """
-        Reads all data files associated with the run from disk.
+        Reads all data files associated with the run from disk (or the cache).
         Optimized for 'last' load_mode to save memory.
         """
-        i = 0
-        last_valid_i = -1
-        while True:
-            conc_path = self.run_path / f"Static_Conc_{i}.dat"
-            if not conc_path.exists():
-                break
-            last_valid_i = i
-            i += 1
+        if self.cache_dir is not None:
+            self._cache_entry = run_cache.entry_path(self.cache_dir, self.run_path, self.run_name, self.load_mode)
+            if self._read_cache():
+                return
+        self._read_files()
+        if self._cache_entry is not None:
+            self._write_cache()
+
+    def _read_files(self):
+        last_valid_i = last_iteration(scan_iterations(self.run_path).static_conc)
         
         if last_valid_i == -1:
             self._populate_with_nan()
@@ -109,11 +192,14 @@ class ChelioRun:
         
         data_frames = []
         mus_list = []
-        altitudes_list = []
-        convective_list = []
+        valid = []
 
         # Read header from the first available file to initialize dimensions
         self._read_header_info(self.run_path / f"Static_Conc_0.dat")
+
+        if self.lazy:
+            self._read_lazy(list(indices_to_load))
+            return
         
         for i in indices_to_load:
             conc_path = self.run_path / f"Static_Conc_{i}.dat"
@@ -121,55 +207,289 @@ class ChelioRun:
             with warnings.catch_warnings():
                 warnings.simplefilter("error", UserWarning)
                 try:
-                    d = np.loadtxt(conc_path, skiprows=3)
+                    d = _read_table(conc_path, skiprows=3)
                     data_frames.append(d)
                     
                     # Load associated files
                     mu_path = self.run_path / f"vertical_mix_{i}.dat"
                     if mu_path.exists():
-                        mus_list.append(np.loadtxt(mu_path, skiprows=1, usecols=3))
+                        mus_list.append(_read_table(mu_path, skiprows=1, usecols=3))
                     else: # If any file is missing, it's safer to add NaNs
                         mus_list.append(np.full(self.n_layers, np.nan))
-                    
-                    tp_path = self.run_path / f"{self.run_name}_tp.dat"
-                    if tp_path.exists():
-                        altitudes_list.append(np.loadtxt(tp_path, skiprows=2, usecols=3))
-                        convective_list.append(np.loadtxt(tp_path, skiprows=2, usecols=6))
-                    else:
-                        altitudes_list.append(np.full(self.n_layers, np.nan))
-                        convective_list.append(np.full(self.n_layers, np.nan))
+                    valid.append(True)
 
                 except (UserWarning, IndexError, ValueError): # Catches malformed files
                     data_frames.append(np.full((self.n_layers, data_frames[0].shape[1]), np.nan))
                     mus_list.append(np.full(self.n_layers, np.nan))
-                    altitudes_list.append(np.full(self.n_layers, np.nan))
-                    convective_list.append(np.full(self.n_layers, np.nan))
+                    valid.append(False)
 
         self.num_iterations_read = len(data_frames)
         if not data_frames:
             self._populate_with_nan()
             return
 
+        self._regrid_data_frames(data_frames, mus_list)
+        altitudes_list, convective_list = self._read_tp_files(list(indices_to_load), mus_list, valid)
         self._process_data_frames(data_frames, mus_list, altitudes_list, convective_list)
         self._read_escape_time()
-        self._check_convergence(data_frames[-1])
+        self._check_convergence(data_frames[-1][:, 2], data_frames[-1][:, 0])
         
         if self.load_mode == 'last' and not self.final_convergence_status:
             self._populate_with_nan()
 
+    def _read_lazy(self, indices):
+        """Reads only pressure and temperature of the last iteration; everything else on access."""
+        self.num_iterations_read = len(indices)
+        last = self._read_conc_columns(indices[-1], [0, 2])
+        if last is None:
+            last = np.full((self.n_layers, 2), np.nan)
+        self.n_layers = last.shape[0]
+        self._read_escape_time()
+        self._check_convergence(last[:, 1], last[:, 0])
+
+        if self.load_mode == 'last' and not self.final_convergence_status:
+            self._populate_with_nan()
+            return
+
+        self._lazy_indices = indices
+        for name in self._raw_names + self._converted_names:
+            self.__dict__.pop(name, None)
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not set, i.e. quantities of a lazy run not read yet
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self.__dict__.get('_lazy_indices') is None:
+            if name in self.__dict__.get('_dropped_raw', ()):
+                raise AttributeError(f"'{name}' was dropped by convert_to_vmr(in_place=True); load the run again to access it")
+            raise AttributeError(name)
+        if name in self._raw_names:
+            value = self._cached(name, lambda: self._load_raw(name))
+        elif name in self._converted_names:
+            value = self._cached(name, lambda: self._convert(name))
+        else:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        setattr(self, name, value)
+        return value
+
+    def _cached(self, name: str, compute) -> np.ndarray:
+        """Array `name` from the cache entry of the run, computed and added to it if missing."""
+        if self._cache_entry is None:
+            return compute()
+        value = run_cache.load_array(self._cache_entry, name)
+        if value is None:
+            value = compute()
+            run_cache.store_array(self._cache_entry, name, value)
+        return value
+
+    def _read_cache(self) -> bool:
+        """Restores the run from its cache entry. False if there is no (complete) entry."""
+        meta = run_cache.load_meta(self._cache_entry)
+        if meta is None:
+            return False
+        arrays = {}
+        if meta['lazy_indices'] is None or not self.lazy:
+            for name in self._raw_names:
+                arrays[name] = run_cache.load_array(self._cache_entry, name)
+                if arrays[name] is None: # entry of a lazy run, not all quantities cached
+                    return False
+
+        for key in ['n_elem', 'n_mol', 'n_dust', 'n_layers', 'atom_names', 'mol_names', 'dust_names',
+                    'num_iterations_read', 'final_convergence_status', 'escape_time_yrs', '_n_columns']:
+            setattr(self, key, meta[key])
+        if arrays:
+            for name, value in arrays.items():
+                setattr(self, name, value)
+        else:
+            self._lazy_indices = meta['lazy_indices']
+            for name in self._raw_names + self._converted_names:
+                self.__dict__.pop(name, None)
+        return True
+
+    def _write_cache(self):
+        meta = {
+            'n_elem': int(self.n_elem or 0), 'n_mol': int(self.n_mol or 0), 'n_dust': int(self.n_dust or 0),
+            'n_layers': int(self.n_layers or 0), 'atom_names': [str(n) for n in self.atom_names],
+            'mol_names': [str(n) for n in self.mol_names], 'dust_names': [str(n) for n in self.dust_names],
+            'num_iterations_read': self.num_iterations_read, 'final_convergence_status': bool(self.final_convergence_status),
+            'escape_time_yrs': float(self.escape_time_yrs), '_n_columns': self._n_columns,
+            'lazy_indices': self._lazy_indices,
+        }
+        run_cache.store_meta(self._cache_entry, meta, self.cache_size)
+        for name in self._raw_names: # for a lazy run, quantities are added as they are read
+            if name in self.__dict__:
+                run_cache.store_array(self._cache_entry, name, self.__dict__[name])
+
+    def _column_ranges(self) -> Dict[str, range]:
+        """Static_Conc columns of the raw quantities."""
+        n_gas = 4 + self.n_elem + self.n_mol
+        n_dust = self.n_dust
+        return {
+            'temperatures_K': range(0, 1),
+            'nHtots': range(1, 2),
+            'pressures_bar': range(2, 3),
+            'atoms_raw': range(3, 4 + self.n_elem),
+            'mols_raw': range(4 + self.n_elem, n_gas),
+            'supersats': range(n_gas, n_gas + n_dust),
+            'dusts_raw': range(n_gas + n_dust, n_gas + 2*n_dust),
+            'eps_atoms_raw': range(n_gas + 2*n_dust, n_gas + 2*n_dust + self.n_elem),
+            'dust_to_gas_raw': range(n_gas + 2*n_dust + self.n_elem, n_gas + 2*n_dust + self.n_elem + 1),
+            'dust_vol': range(n_gas + 2*n_dust + self.n_elem + 1, n_gas + 2*n_dust + self.n_elem + 2),
+        }
+
+    def _read_conc_columns(self, i: int, cols: List[int]):
+        """Given columns of Static_Conc_{i} as (n_layers, len(cols)), None for a malformed file."""
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", UserWarning)
+            try:
+                d = _read_table(self.run_path / f"Static_Conc_{i}.dat", skiprows=3, usecols=cols)
+                return np.asarray(d, dtype=float).reshape(-1, len(cols))
+            except (UserWarning, IndexError, ValueError):
+                return None
+
+    def _load_conc_columns(self, cols: List[int]) -> np.ndarray:
+        """Given Static_Conc columns of all iterations of a lazy run, regridded like in read_data."""
+        read_cols = sorted(set(cols) | {2}) # pressure is needed for regridding
+        frames = []
+        for i in self._lazy_indices:
+            d = self._read_conc_columns(i, read_cols)
+            frames.append(d if d is not None else np.full((self.n_layers, len(read_cols)), np.nan))
+        self._regrid_data_frames(frames, None, read_cols)
+        return np.array(frames)[:, :, [read_cols.index(c) for c in cols]]
+
+    def _load_raw(self, name: str) -> np.ndarray:
+        if name == 'mus':
+            return self._load_mus()
+        if name in ('altitudes_cm', 'convective_flags'):
+            if name == 'convective_flags': # no altitudes needed
+                return np.array(self._read_tp_files(self._lazy_indices, None)[1])
+            return np.array(self._read_tp_files(self._lazy_indices, list(self.mus))[0])
+
+        cols = self._column_ranges()[name]
+        if name == 'dust_vol' and cols[0] >= self._n_columns:
+            return np.full((self.num_iterations_read, self.n_layers), np.nan)
+        data = self._load_conc_columns(list(cols))
+        if name == 'pressures_bar':
+            data = data * 1e-6
+        if name in ('pressures_bar', 'temperatures_K', 'nHtots', 'dust_to_gas_raw', 'dust_vol'): # one value per layer
+            data = data[:, :, 0]
+        return data
+
+    def _load_mus(self) -> np.ndarray:
+        frames = []
+        mus_list = []
+        for i in self._lazy_indices:
+            P = self._read_conc_columns(i, [2])
+            if P is None:
+                frames.append(np.full((self.n_layers, 1), np.nan))
+                mus_list.append(np.full(self.n_layers, np.nan))
+                continue
+            frames.append(P)
+            mu_path = self.run_path / f"vertical_mix_{i}.dat"
+            if mu_path.exists():
+                mus_list.append(_read_table(mu_path, skiprows=1, usecols=3))
+            else:
+                mus_list.append(np.full(P.shape[0], np.nan))
+        self._regrid_data_frames(frames, mus_list, [2])
+        return np.array(mus_list)
+
+    def _read_tp_files(self, indices, mus_list, valid=None):
+        """
+        Altitudes and convective flags of the given iterations. {run_name}_tp.dat of the
+        last HELIOS run is read once (T, P, altitude and convective flag in one pass).
+        Iterations i whose HELIOS profile {run_name}_tp_coupling_{i}.dat exists get the
+        altitudes of that profile and of their mu (the altitude grid of _tp.dat rescaled,
+        see _rescale_altitudes); the others (the final GGchem output) those of _tp.dat.
+        Convective flags are only written for the last HELIOS run and used for all iterations.
+        With mus_list=None, only the convective flags are read.
+        """
+        nan_list = [np.full(self.n_layers, np.nan) for _ in indices]
+        tp_path = self.run_path / f"{self.run_name}_tp.dat"
+        if not tp_path.exists():
+            return nan_list, [row.copy() for row in nan_list]
+        T_ref, P_ref, z_ref, convective = np.loadtxt(tp_path, skiprows=2, usecols=(1, 2, 3, 6), ndmin=2).T
+        if len(z_ref) != self.n_layers:
+            return nan_list, [row.copy() for row in nan_list]
+
+        if mus_list is None:
+            return None, [convective.copy() for _ in indices]
+
+        coupling_paths = {i: self.run_path / f"{self.run_name}_tp_coupling_{i}.dat" for i in indices}
+        coupled = [i for i in indices if coupling_paths[i].exists()]
+        # _tp.dat is written by the HELIOS run of the last coupled iteration
+        mu_ref = mus_list[list(indices).index(coupled[-1])] if coupled else None
+
+        altitudes_list = []
+        for k, i in enumerate(indices):
+            if valid is not None and not valid[k]:
+                altitudes_list.append(np.full(self.n_layers, np.nan))
+            elif i not in coupled:
+                altitudes_list.append(z_ref.copy())
+            else:
+                reference = (P_ref * 1e-6, T_ref, z_ref, mu_ref)
+                altitudes_list.append(self._coupled_altitudes(coupling_paths[i], P_ref * 1e-6, mus_list[k], reference))
+        return altitudes_list, [convective.copy() for _ in indices]
+
+    def _coupled_altitudes(self, coupling_path: Path, P_bar: np.ndarray, mu: np.ndarray, reference) -> np.ndarray:
+        """
+        Altitudes on the pressure grid P_bar of the HELIOS profile coupling_path
+        ({run_name}_tp_coupling_{i}.dat) for the mean molecular weight mu: the altitude grid
+        of the last HELIOS run, reference = (P [bar], T, altitude, mu), rescaled.
+        """
+        P_ref, T_ref, z_ref, mu_ref = reference
+        if len(P_bar) != len(P_ref) or not np.allclose(P_bar, P_ref):
+            T_ref, z_ref, mu_ref = (_interp_log_p(P_bar, P_ref, q) for q in (T_ref, z_ref, mu_ref))
+        pt = np.loadtxt(coupling_path, skiprows=1, ndmin=2)
+        # HELIOS profile on the pressure grid of the iteration (coarse iterations have fewer layers)
+        T = _interp_log_p(P_bar, pt[:, 0], pt[:, 1])
+        return _rescale_altitudes(z_ref, T_ref, mu_ref, T, mu)
+
     def _read_header_info(self, file_path):
         if not file_path.exists():
              self.n_elem, self.n_mol, self.n_dust, self.n_layers = 0,0,0,0
              return
-        dimension = np.genfromtxt(file_path, dtype=int, max_rows=1, skip_header=1)
-        self.n_elem, self.n_mol, self.n_dust, self.n_layers = dimension
+        _, dimension_line, header_line = read_header(file_path, 3)
+        self.n_elem, self.n_mol, self.n_dust, self.n_layers = np.array(dimension_line.split(), dtype=int)
         
-        header = np.loadtxt(file_path, skiprows=2, max_rows=1, dtype=str)
+        header = np.array(header_line.split())
+        self._n_columns = len(header)
         self.atom_names = list(header[3:4+self.n_elem])
         self.mol_names = list(header[4+self.n_elem:4+self.n_elem+self.n_mol])
         raw_dust_names = header[4+self.n_elem+self.n_mol:4+self.n_elem+self.n_mol+self.n_dust]
         self.dust_names = [name[1:] for name in raw_dust_names]
 
+    def _regrid_data_frames(self, data_frames, mus_list, cols=None):
+        """
+        Interpolates iterations on a different layer grid (coarse iterations of a
+        coarse-to-fine run) in log(P) onto the grid of the last iteration, in place.
+        `cols` are the Static_Conc columns of the frames if not all are read
+        (must include the pressure, column 2); mus_list may be None.
+        """
+        cols = list(range(data_frames[-1].shape[1])) if cols is None else list(cols)
+        i_P = cols.index(2)
+        self.n_layers = data_frames[-1].shape[0]
+        x_new = np.log10(data_frames[-1][:, i_P])
+        for k, d in enumerate(data_frames):
+            if d.shape[0] == self.n_layers:
+                continue
+            if np.all(np.isnan(d)):
+                data_frames[k] = np.full((self.n_layers, d.shape[1]), np.nan)
+                if mus_list is not None:
+                    mus_list[k] = np.full(self.n_layers, np.nan)
+                continue
+            order = np.argsort(d[:, i_P])
+            x_old = np.log10(d[order, i_P])
+            regridded = np.array([np.interp(x_new, x_old, d[order, j]) for j in range(d.shape[1])]).T
+            if 1 in cols: # nHtot is not given as log10
+                regridded[:, cols.index(1)] = 10**np.interp(x_new, x_old, np.log10(d[order, cols.index(1)]))
+            data_frames[k] = regridded
+            if mus_list is None:
+                continue
+            if len(mus_list[k]) == d.shape[0]:
+                mus_list[k] = np.interp(x_new, x_old, mus_list[k][order])
+            else:
+                mus_list[k] = np.full(self.n_layers, np.nan)
+
     def _process_data_frames(self, data_frames, mus_list, altitudes_list, convective_list):
         all_data = np.array(data_frames) # (n_iter, n_layers, n_cols)
         
@@ -216,13 +536,13 @@ class ChelioRun:
         self.final_convergence_status = False
 
 
-    def _check_convergence(self, last_data_frame):
+    def _check_convergence(self, last_pressures, last_temperatures):
         # Based on comments and logic from notebooks, a run has not converged if:
         # 1. The final pressure in the top layer is not 1e-1 dyn/cm^2.
         # 2. The temperature profile is a dummy array of all 1.001 K.
         # This logic is more robust than the original notebook code.
-        failed_pressure = last_data_frame[-1, 2] != 1e-1
-        failed_temperature = np.all(last_data_frame[:, 0] == 1.001)
+        failed_pressure = last_pressures[-1] != 1e-1
+        failed_temperature = np.all(last_temperatures == 1.001)
 
         if failed_pressure or failed_temperature:
             self.final_convergence_status = False
@@ -241,35 +561,100 @@ class ChelioRun:
         else:
             self.escape_time_yrs = np.nan
 
-    def convert_to_vmr(self):
+    def convert_to_vmr(self, dtype=np.float64, in_place: bool = False):
         """
         Converts raw logarithmic data to volume/mass mixing ratios.
+        n_tots is computed in log space (log-sum-exp), so extreme log-densities neither
+        overflow nor underflow, and each raw array is exponentiated only once.
+        dtype=np.float32 halves the memory of the mixing ratios. With in_place=True,
+        they are written into the buffers of the raw arrays, which are dropped
+        afterwards: a lazy run reads them again if they are accessed, for a run read
+        eagerly, accessing them raises an AttributeError (load the run again to get them).
         """
         if self.is_converted or self.atoms_raw.size == 0 or np.all(np.isnan(self.atoms_raw)):
             return
 
-        # Calculate n_tots (total number density)
-        self.n_tots = np.sum(10**self.mols_raw, axis=-1) + np.sum(10**self.atoms_raw, axis=-1)
-        self.n_tots = self.n_tots[..., np.newaxis]
-
-        # Convert atomic abundances (log(cm^-3)) to volume mixing ratios
-        self.atoms_vmr = 10**self.atoms_raw / self.n_tots
-        
-        # Convert molecular abundances (log(cm^-3)) to volume mixing ratios
-        self.mols_vmr = 10**self.mols_raw / self.n_tots
-
-        # Convert dust concentrations from log10(nCond/nHtot) to volume mixing ratios
-        self.dusts_vmr = 10**self.dusts_raw * self.nHtots[..., np.newaxis] / self.n_tots
-
-        # Convert elemental abundances
-        self.eps_atoms_mr = 10**self.eps_atoms_raw
-        self.eps_atoms_mr /= np.sum(self.eps_atoms_mr, axis=-1, keepdims=True)
-
-        # Convert dust-to-gas ratio
-        self.dust_to_gas_mr = 10**self.dust_to_gas_raw
+        log_n_tots, self.atoms_vmr, self.mols_vmr = self._gas_vmrs(dtype, in_place)
+        self.n_tots = 10**log_n_tots
+        for name in ['dusts_vmr', 'eps_atoms_mr', 'dust_to_gas_mr']:
+            setattr(self, name, self._convert(name, dtype, in_place))
+        if in_place:
+            for name in ['atoms_raw', 'mols_raw', 'dusts_raw', 'eps_atoms_raw', 'dust_to_gas_raw']:
+                if self.__dict__.pop(name, None) is not None:
+                    self._dropped_raw.add(name)
         
         self.is_converted = True
 
+    def _gas_vmrs(self, dtype=np.float64, in_place: bool = False):
+        """log10(n_tots) and the atomic and molecular VMRs, each exponentiated once."""
+        return _gas_mixing_ratios(self.atoms_raw, self.mols_raw, dtype, in_place)
+
+    def _convert(self, name: str, dtype=np.float64, in_place: bool = False) -> np.ndarray:
+        if name == 'n_tots':
+            # Calculate n_tots (total number density)
+            return 10**self._gas_vmrs()[0]
+        if name in ('atoms_vmr', 'mols_vmr'):
+            # Convert atomic/molecular abundances (log(cm^-3)) to volume mixing ratios
+            raw = self.atoms_raw if name == 'atoms_vmr' else self.mols_raw
+            return _exp10_shifted(raw, np.log10(self.n_tots), dtype, in_place)
+        if name == 'dusts_vmr':
+            # Convert dust concentrations from log10(nCond/nHtot) to volume mixing ratios
+            shift = np.log10(self.n_tots) - np.log10(self.nHtots)[..., np.newaxis]
+            return _exp10_shifted(self.dusts_raw, shift, dtype, in_place)
+        if name == 'eps_atoms_mr':
+            # Convert elemental abundances, normalized over all elements
+            return _normalized_mixing_ratios(self.eps_atoms_raw, dtype, in_place)
+        if name == 'dust_to_gas_mr':
+            # Convert dust-to-gas ratio
+            return _exp10_shifted(self.dust_to_gas_raw, 0., dtype, in_place)
+        raise ValueError(f"Unknown quantity '{name}'")
+
+    def get_species_profile(self, name: str, mol_type: str = 'mol') -> np.ndarray:
+        """
+        Profiles (n_iterations, n_layers) of a single species: VMR for mol_type 'mol',
+        'atom' and 'dust', supersaturation ratio for 'supersat' and elemental abundance
+        for 'eps'. A lazy run only reads the columns needed for it. None if the species
+        is not found.
+        """
+        kind = {'mol': 'mols_raw', 'atom': 'atoms_raw', 'eps': 'eps_atoms_raw',
+                'dust': 'dusts_raw', 'supersat': 'supersats'}[mol_type]
+        names = self.mol_names if mol_type == 'mol' else self.dust_names if kind in ('dusts_raw', 'supersats') else self.atom_names
+        if name not in names:
+            return None
+        idx = names.index(name)
+        if mol_type == 'eps':
+            idx = idx - 1 # remove electron (first entry of atom_names)
+
+        if self._lazy_indices is None: # all data already read
+            if not self.is_converted:
+                self.convert_to_vmr()
+            converted = {'mol': self.mols_vmr, 'atom': self.atoms_vmr, 'eps': self.eps_atoms_mr,
+                         'dust': self.dusts_vmr, 'supersat': self.supersats}[mol_type]
+            return converted[..., idx]
+
+        if mol_type == 'eps': # normalized over all elements
+            return self.eps_atoms_mr[..., idx]
+        gas_loaded = [k for k in ('atoms_raw', 'mols_raw') if k in self.__dict__]
+        # n_tots first: if it is not cached, the raw gas blocks are read for it and
+        # the column of a gas species is taken from them instead of being read again
+        log_n_tots = np.log10(self.n_tots[..., 0]) if mol_type != 'supersat' else None
+        if kind in self.__dict__:
+            column = getattr(self, kind)[..., idx]
+        else:
+            col = self._column_ranges()[kind][idx]
+            column = self._cached(f'column_{col}', lambda: self._load_conc_columns([col])[..., 0])
+        if mol_type == 'supersat':
+            profile = column
+        elif mol_type == 'dust':
+            profile = 10**(column + np.log10(self.nHtots) - log_n_tots)
+        else:
+            profile = 10**(column - log_n_tots)
+        # raw gas blocks only read for n_tots are not kept
+        for k in ('atoms_raw', 'mols_raw'):
+            if k not in gas_loaded:
+                self.__dict__.pop(k, None)
+        return profile
+
     def get_iteration_data(self, iteration_index: int = -1) -> Dict[str, Any]:
         """
         Returns a dictionary of all processed data for a specific iteration.
@@ -306,30 +691,216 @@ class ChelioRun:
         except IndexError:
             return { "error": f"Iteration {iteration_index} out of bounds." }
 
+    def iter_iterations(self, start: int = 0):
+        """
+        Yields the data of the coupling iterations of the run one at a time (as dictionaries
+        like get_iteration_data, plus 'iteration'), each on its own layer grid. Only one
+        iteration is held in memory and the arrays are reused for the next one (copy what
+        you keep), so long histories run in constant memory and iterations with different
+        layer counts need no padding. Independent of load_mode; read_data() is not needed.
+        """
+        if self.n_layers is None:
+            self._read_header_info(self.run_path / "Static_Conc_0.dat")
+        n_iterations = n_consecutive(scan_iterations(self.run_path).static_conc)
+        coupling_paths = [self.run_path / f"{self.run_name}_tp_coupling_{i}.dat" for i in range(n_iterations)]
+        coupled = [i for i in range(n_iterations) if coupling_paths[i].exists()]
+        reference, convective = self._altitude_reference(coupled[-1] if coupled else None)
+
+        buffers = {}
+        def buffer(name, shape):
+            if name not in buffers or buffers[name].shape != shape:
+                buffers[name] = np.empty(shape)
+            return buffers[name]
+
+        for i in range(start, n_iterations):
+            with warnings.catch_warnings():
+                warnings.simplefilter("error", UserWarning)
+                try:
+                    d = _read_table(self.run_path / f"Static_Conc_{i}.dat", skiprows=3)
+                except (UserWarning, IndexError, ValueError): # Catches malformed files
+                    yield {"iteration": i, "error": f"Iteration {i} could not be read."}
+                    continue
+            if not self._n_columns:
+                self._n_columns = d.shape[1]
+            n_layers = d.shape[0]
+            cols = self._column_ranges()
+            block = lambda name: d[:, cols[name].start:cols[name].stop]
+
+            P_bar = np.multiply(d[:, 2], 1e-6, out=buffer('pressure_bar', (n_layers,)))
+            mu = buffer('mu', (n_layers,))
+            mu_path = self.run_path / f"vertical_mix_{i}.dat"
+            mus = _read_table(mu_path, skiprows=1, usecols=3) if mu_path.exists() else None
+            mu[:] = mus if mus is not None and len(mus) == n_layers else np.nan
+
+            if reference is None:
+                altitudes = np.full(n_layers, np.nan)
+            elif i in coupled:
+                altitudes = self._coupled_altitudes(coupling_paths[i], P_bar, mu, reference)
+            else:
+                altitudes = _interp_log_p(P_bar, reference[0], reference[2])
+
+            nHtot = d[:, 1]
+            log_n_tot, atoms_vmr, mols_vmr = _gas_mixing_ratios(
+                block('atoms_raw'), block('mols_raw'),
+                out=(buffer('atoms_vmr', block('atoms_raw').shape), buffer('mols_vmr', block('mols_raw').shape)))
+            dusts_vmr = _exp10_shifted(block('dusts_raw'), log_n_tot - np.log10(nHtot)[:, np.newaxis],
+                                       out=buffer('dusts_vmr', block('dusts_raw').shape))
+            eps_atoms_mr = _normalized_mixing_ratios(block('eps_atoms_raw'), out=buffer('eps_atoms_mr', block('eps_atoms_raw').shape))
+            dust_vol = d[:, cols['dust_vol'].start] if cols['dust_vol'].start < d.shape[1] else np.full(n_layers, np.nan)
+
+            yield {
+                "iteration": i,
+                "pressure_bar": P_bar,
+                "temperature_K": d[:, 0],
+                "altitude_cm": altitudes,
+                "nHtot": nHtot,
+                "mu": mu,
+                "convective_flag": convective if len(convective) == n_layers else np.full(n_layers, np.nan),
+                "atom_names": self.atom_names,
+                "mol_names": self.mol_names,
+                "dust_names": self.dust_names,
+                "atoms_vmr": atoms_vmr,
+                "mols_vmr": mols_vmr,
+                "dusts_vmr": dusts_vmr,
+                "supersats": block('supersats'),
+                "eps_atoms_mr": eps_atoms_mr,
+                "dust_to_gas_mr": 10**block('dust_to_gas_raw')[:, 0],
+                "dust_vol": dust_vol,
+            }
+
+    def _altitude_reference(self, last_coupled):
+        """
+        (P [bar], T, altitude, mu) of the last HELIOS run, written by coupling iteration
+        last_coupled to {run_name}_tp.dat, and its convective flags; (None, []) without it.
+        """
+        tp_path = self.run_path / f"{self.run_name}_tp.dat"
+        if not tp_path.exists():
+            return None, np.array([])
+        T_ref, P_ref, z_ref, convective = np.loadtxt(tp_path, skiprows=2, usecols=(1, 2, 3, 6), ndmin=2).T
+        P_ref = P_ref * 1e-6
+        mu_ref = np.full(len(P_ref), np.nan)
+        mu_path = self.run_path / f"vertical_mix_{last_coupled}.dat"
+        if last_coupled is not None and mu_path.exists():
+            P_mu = _read_table(self.run_path / f"Static_Conc_{last_coupled}.dat", skiprows=3, usecols=2) * 1e-6
+            mus = _read_table(mu_path, skiprows=1, usecols=3)
+            if len(mus) == len(P_mu):
+                mu_ref = _interp_log_p(P_ref, P_mu, mus)
+        return (P_ref, T_ref, z_ref, mu_ref), convective
+
+    def convergence_history(self):
+        """
+        RMS and maximum change of T(P) [K] between consecutive iterations, computed while
+        streaming over the iterations (see iter_iterations), the previous profile interpolated
+        onto the pressure grid of the next one if the layer counts differ.
+        Returns the iteration numbers and the two changes as arrays (NaN for unreadable iterations).
+        """
+        iterations, dT_rms, dT_max = [], [], []
+        P_old, T_old = None, None
+        for data in self.iter_iterations():
+            if "error" in data:
+                P_old, T_old = None, None
+                continue
+            P_new, T_new = data['pressure_bar'], data['temperature_K']
+            if P_old is not None:
+                dT = np.abs(T_new - _interp_log_p(P_new, P_old, T_old))
+                iterations.append(data['iteration'])
+                dT_rms.append(np.sqrt(np.mean(dT**2)))
+                dT_max.append(np.max(dT))
+            P_old, T_old = P_new.copy(), np.array(T_new)
+        return np.array(iterations, dtype=int), np.array(dT_rms), np.array(dT_max)
+
+
+def _map_runs(function, args_list, workers: int = 1, pool: str = 'process') -> list:
+    """Applies function(*args) to each entry of args_list, on a process or thread pool if workers > 1."""
+    if workers is None or workers <= 1 or len(args_list) <= 1:
+        return [function(*args) for args in args_list]
+    if pool not in ('process', 'thread'):
+        raise ValueError("pool must be 'process' or 'thread'")
+    executor = ProcessPoolExecutor if pool == 'process' else ThreadPoolExecutor
+    with executor(max_workers=workers) as ex:
+        return list(ex.map(function, *zip(*args_list)))
+
+def _load_run(base_folder: Path, run_name: str, load_mode: str, cache_dir, cache_size: float) -> ChelioRun:
+    run = ChelioRun(base_folder, run_name, load_mode=load_mode, cache_dir=cache_dir, cache_size=cache_size)
+    run.read_data()
+    return run
+
+def _extract_from_run(base_folder: Path, run_name: str, what_to_extract: str, load_mode: str, mol_type: str,
+                      cache_dir, cache_size: float):
+    """Reads a run and returns only the requested value (NaN if the run has not converged)."""
+    mol = mol_type == 'mol'
+
+    dust = mol_type == 'dust'
+    supersat = mol_type == 'supersat'
+    dust = dust or supersat
+    
+    atom = mol_type == 'atom'
+    eps = mol_type == 'eps'
+    atom = atom or eps
+
+    # Lazy: only the columns of the requested quantity are read
+    run = ChelioRun(base_folder, run_name, load_mode=load_mode, lazy=True, cache_dir=cache_dir, cache_size=cache_size)
+    run.read_data()
+    
+    # --- Extract Data ---
+    data_point = np.nan
+    if run.final_convergence_status:
+        
+        if hasattr(run, what_to_extract):
+            data_point = np.squeeze(getattr(run, what_to_extract))
+        elif what_to_extract in run.mol_names and mol:
+            data_point = run.get_species_profile(what_to_extract, 'mol')[0]
+        elif what_to_extract in run.dust_names and dust:
+            data_point = run.get_species_profile(what_to_extract, mol_type)[0]
+        elif what_to_extract in run.atom_names and atom:
+            data_point = run.get_species_profile(what_to_extract, mol_type)[0]
+        # --- Handle special scalar cases for convenience ---
+        elif what_to_extract == 'T_surf' or what_to_extract == 'T_BOA':
+            data_point = run.temperatures_K[0, 0]
+        elif what_to_extract == 'T_TOA':
+            data_point = run.temperatures_K[0, -1]
+    return data_point
+
 def load_parameter_sweep(
     base_folder: str or Path, 
     fixed_params: Dict[str, Any], 
     varying_param_name: str, 
     varying_param_values: List[Any], 
     load_mode: str = 'last', 
+    workers: int = 1,
+    pool: str = 'process',
+    cache_dir: str or Path = None,
+    cache_size: float = 2000,
+    use_catalog: bool = False,
+    refresh: bool = False,
     **kwargs
 ) -> List[ChelioRun]:
     """
     Loads a series of ChelioRun objects for a parameter sweep.
+    With workers > 1, the runs are read in parallel on a 'process' or 'thread' pool.
+    With a cache_dir, parsed runs are cached on disk (see ChelioRun).
+    With use_catalog=True, runs are looked up by parameter value in the catalog of
+    base_folder (see catalog.py) instead of by their formatted name. The catalog is
+    only updated if a run is not in it, or before the lookup with refresh=True.
     """
+    from .catalog import find_runs # imported here, catalog.py also runs as a script
     if not isinstance(base_folder, Path):
         base_folder = Path(base_folder)
         
-    runs = []
+    run_names = []
     for value in varying_param_values:
         current_params = fixed_params.copy()
         current_params[varying_param_name] = value
         current_params.update(kwargs)
-        
-        run_name = _build_run_name(current_params)
-        run = ChelioRun(base_folder, run_name, load_mode=load_mode)
-        run.read_data()
-        runs.append(run)
+        run_names.append(_build_run_name(current_params))
+    if use_catalog:
+        entries = find_runs(base_folder, run_names, refresh=refresh)
+        run_names = [entry['name'] if entry is not None else name for name, entry in zip(run_names, entries)]
+
+    args_list = [(base_folder, run_name, load_mode, cache_dir, cache_size) for run_name in run_names]
+    runs = _map_runs(_load_run, args_list, workers, pool)
+    if cache_dir is not None:
+        run_cache.evict(cache_dir, cache_size)
     return runs
 
 def load_parameter_matrix(
@@ -342,85 +913,72 @@ def load_parameter_matrix(
     what_to_extract: str,
     load_mode: str = 'last',
     mol_type: str = 'mol',
+    workers: int = 1,
+    pool: str = 'process',
+    cache_dir: str or Path = None,
+    cache_size: float = 2000,
+    use_catalog: bool = False,
+    refresh: bool = False,
     **kwargs
 ) -> np.ndarray:
     """
     Loads a 2D matrix of data from a parameter grid. 
     Can extract scalars (e.g., 'T_surf') or 1D profiles (e.g., 'temperatures_K').
+    With workers > 1, the runs are read in parallel on a 'process' or 'thread' pool;
+    each worker only returns the extracted value.
+    With a cache_dir, parsed runs are cached on disk (see ChelioRun).
+    With use_catalog=True, runs are looked up in the catalog of base_folder (see
+    catalog.py), which is only updated if a run is not in it (or before the lookup
+    with refresh=True); runs that do not exist are then not read at all.
     """
+    from .catalog import find_runs # imported here, catalog.py also runs as a script
     if not isinstance(base_folder, Path):
         base_folder = Path(base_folder)
 
-    mol = mol_type == 'mol'
-
-    dust = mol_type == 'dust'
-    supersat = mol_type == 'supersat'
-    dust = dust or supersat
-    
-    atom = mol_type == 'atom'
-    eps = mol_type == 'eps'
-    atom = atom or eps
-    
-    # --- Determine the shape of the output array ---
-    result_matrix = None
-    first_run_processed = False
-
-    for i, p1_val in enumerate(param1_values):
-        for j, p2_val in enumerate(param2_values):
+    run_names = []
+    for p1_val in param1_values:
+        for p2_val in param2_values:
             current_params = fixed_params.copy()
             current_params[param1_name] = p1_val
             current_params[param2_name] = p2_val
             current_params.update(kwargs)
+            run_names.append(_build_run_name(current_params))
+    to_read = [True] * len(run_names)
+    if use_catalog:
+        entries = find_runs(base_folder, run_names, refresh=refresh)
+        to_read = [entry is not None for entry in entries]
+        run_names = [entry['name'] if entry is not None else name for name, entry in zip(run_names, entries)]
+
+    args_list = [(base_folder, run_name, what_to_extract, load_mode, mol_type, cache_dir, cache_size)
+                 for run_name in run_names]
+    read_points = iter(_map_runs(_extract_from_run, [a for a, r in zip(args_list, to_read) if r], workers, pool))
+    data_points = [next(read_points) if r else np.nan for r in to_read]
+    if cache_dir is not None:
+        run_cache.evict(cache_dir, cache_size)
+    
+    # --- Determine the shape of the output array ---
+    result_matrix = None
+    first_run_processed = False
 
-            run_name = _build_run_name(current_params)
-            run = ChelioRun(base_folder, run_name, load_mode=load_mode)
-            run.read_data()
-            run.convert_to_vmr()
-            
-            # --- Extract Data ---
-            data_point = np.nan
-            if run.final_convergence_status:
-                
-                if hasattr(run, what_to_extract):
-                    data_point = np.squeeze(getattr(run, what_to_extract))
-                elif what_to_extract in run.mol_names and mol:
-                    idx = run.mol_names.index(what_to_extract)
-                    data_point = run.mols_vmr[0, :, idx]
-                elif what_to_extract in run.dust_names and dust:
-                    idx = run.dust_names.index(what_to_extract)
-                    if supersat:
-                        data_point = run.supersats[0, :, idx]
-                    else:
-                        data_point = run.dusts_vmr[0, :, idx]
-                elif what_to_extract in run.atom_names and atom:
-                    idx = run.atom_names.index(what_to_extract)
-                    if eps:
-                        idx = idx - 1 # remove electron (first entry of atom_names)
-                        data_point = run.eps_atoms_mr[0, :, idx]
-                    else:
-                        data_point = run.atoms_vmr[0, :, idx]
-                # --- Handle special scalar cases for convenience ---
-                elif what_to_extract == 'T_surf' or what_to_extract == 'T_BOA':
-                    data_point = run.temperatures_K[0, 0]
-                elif what_to_extract == 'T_TOA':
-                    data_point = run.temperatures_K[0, -1]
-
-            # --- Initialize result matrix on first valid data point ---
-            if not first_run_processed:
-                if hasattr(data_point, 'shape'):
-                    # It's a profile
-                    profile_shape = data_point.shape
-                    result_matrix = np.full((len(param1_values), len(param2_values)) + profile_shape, np.nan)
-                else:
-                    # It's a scalar
-                    result_matrix = np.full((len(param1_values), len(param2_values)), np.nan)
-                first_run_processed = True
-            
-            if result_matrix is not None:
-                result_matrix[i, j] = data_point
+    for k, data_point in enumerate(data_points):
+        i, j = divmod(k, len(param2_values))
+
+        # --- Initialize result matrix on first valid data point ---
+        if not first_run_processed:
+            if hasattr(data_point, 'shape'):
+                # It's a profile
+                profile_shape = data_point.shape
+                result_matrix = np.full((len(param1_values), len(param2_values)) + profile_shape, np.nan)
+            else:
+                # It's a scalar
+                result_matrix = np.full((len(param1_values), len(param2_values)), np.nan)
+            first_run_processed = True
+        
+        if result_matrix is not None:
+            result_matrix[i, j] = data_point
     
     if result_matrix is None:
         # This happens if no runs were found or converged
         return np.array([])
 
-    return result_matrix 
\ No newline at end of file
+    return result_matrix
@@ -0,0 +1,15 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+# Reading of the pipeline outputs and their binary sidecars (source/ggchem_io.py),
+# used as is so that the analysis and the pipeline scripts read the same files.
+
+if 'chelio_ggchem_io' not in sys.modules:
+    _spec = importlib.util.spec_from_file_location('chelio_ggchem_io', Path(__file__).resolve().parents[2] / 'source' / 'ggchem_io.py')
+    sys.modules['chelio_ggchem_io'] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(sys.modules['chelio_ggchem_io'])
+_module = sys.modules['chelio_ggchem_io']
+
+read_table = _module.read_table
+read_header = _module.read_header
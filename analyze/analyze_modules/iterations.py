@@ -0,0 +1,18 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+# Iteration discovery of the pipeline (source/iterations.py), used as is so that
+# the analysis and the pipeline scripts agree on which iterations a run has.
+
+if 'chelio_iterations' not in sys.modules: # registered, e.g. for pickling RunIterations in worker processes
+    _spec = importlib.util.spec_from_file_location('chelio_iterations', Path(__file__).resolve().parents[2] / 'source' / 'iterations.py')
+    sys.modules['chelio_iterations'] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(sys.modules['chelio_iterations'])
+_module = sys.modules['chelio_iterations']
+
+RunIterations = _module.RunIterations
+parse_iterations = _module.parse_iterations
+scan_iterations = _module.scan_iterations
+n_consecutive = _module.n_consecutive
+last_iteration = _module.last_iteration
@@ -3,6 +3,7 @@ import numpy as np
 from typing import List, Any, Union
 from matplotlib.colors import LogNorm, SymLogNorm
 from .data_loader import ChelioRun
+from .iterations import scan_iterations, n_consecutive
 
 def _get_profile_data(data: dict, chelio_run: ChelioRun, param_key: str, mol_type: str = 'mol'):
     """Helper function to extract a data profile based on a key."""
@@ -193,43 +194,39 @@ def plot_all_iteration_profiles(
 ):
     """
     Plots the evolution of a profile over all coupling iterations for a single run.
+    The iterations are read one at a time (ChelioRun.iter_iterations), so the run does
+    not need to be loaded with load_mode='all'.
     """
-    if chelio_run.load_mode != 'all':
-        print("Warning: ChelioRun was not loaded with load_mode='all'. Plot may be incomplete.")
-    
     if ax is None:
         fig, ax = plt.subplots()
     else:
         fig = ax.get_figure()
     
-    # Setup axes once, based on the last iteration.
-    if chelio_run.num_iterations_read > 0:
-        if not chelio_run.is_converted:
-            chelio_run.convert_to_vmr()
-        data = chelio_run.get_iteration_data(-1)
-        if "error" not in data:
-            _, x_label = _get_profile_data(data, chelio_run, param_key, mol_type)
-            _setup_profile_axes(ax, y_axis, x_label, log_x, log_y)
-
     cmap = plt.get_cmap(cmap_name)
-    num_iters = chelio_run.num_iterations_read
+    num_iters = n_consecutive(scan_iterations(chelio_run.run_path).static_conc)
+    axes_ready = False
     
-    for i in range(num_iters):
-        data = chelio_run.get_iteration_data(i)
+    for data in chelio_run.iter_iterations():
         if "error" in data:
             continue
+        i = data['iteration']
+
+        x_data, x_label = _get_profile_data(data, chelio_run, param_key, mol_type)
+        # Setup axes once
+        if not axes_ready:
+            _setup_profile_axes(ax, y_axis, x_label, log_x, log_y)
+            axes_ready = True
 
         if y_axis == 'pressure':
             y_data = data['pressure_bar']
         else:
-            y_data = data['altitudes_cm']
-
-        x_data, _ = _get_profile_data(data, chelio_run, param_key, mol_type)
+            y_data = data['altitude_cm']
         
         color = cmap(i / max(1, num_iters - 1))
         label = f"{i}"
         
-        ax.plot(x_data, y_data, color=color, label=label, **kwargs)
+        # copies, the arrays of an iteration are reused for the next one
+        ax.plot(np.array(x_data), np.array(y_data), color=color, label=label, **kwargs)
     
     ax.legend()
     return fig, ax
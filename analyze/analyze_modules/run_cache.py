@@ -0,0 +1,121 @@
+import numpy as np
+from pathlib import Path
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, Any, Optional
+
+# On-disk cache of parsed ChelioRun arrays, shared between notebook sessions.
+#
+# Each entry is a directory <cache_dir>/<run>_<files>/ with
+#   meta.json:   dimensions, names, loaded iterations and convergence status
+#   <name>.npy:  one file per parsed quantity (e.g. temperatures_K.npy), added
+#                as they are read, so lazy runs only cache what was accessed
+# <run> is a hash of the run path and load mode, <files> a hash of the names,
+# modification times and sizes of the run's output files. A rerun or a change
+# of any of these files gives a new entry, and the old entry of the run is
+# removed. Entries are evicted least recently used first beyond a size cap.
+
+CACHE_VERSION = 1
+eviction_interval = 60 # [s], between automatic evictions in one process
+_last_eviction = 0.0
+
+
+def run_files(run_path: Path, run_name: str) -> list:
+    """(name, mtime, size) of the output files a parsed run depends on."""
+    files = []
+    try:
+        entries = list(os.scandir(run_path))
+    except FileNotFoundError:
+        return files
+    for entry in entries:
+        name = entry.name
+        if name.startswith(('Static_Conc_', 'vertical_mix_', f'{run_name}_tp_coupling_')) or name in (f'{run_name}_tp.dat', 'escape.dat'):
+            stat = entry.stat()
+            files.append((name, stat.st_mtime_ns, stat.st_size))
+    return sorted(files)
+
+
+def entry_path(cache_dir: Path, run_path: Path, run_name: str, load_mode: str) -> Path:
+    run_key = hashlib.sha256(f'{CACHE_VERSION} {Path(run_path).resolve()} {load_mode}'.encode()).hexdigest()[:16]
+    file_key = hashlib.sha256(json.dumps(run_files(run_path, run_name)).encode()).hexdigest()[:16]
+    return Path(cache_dir) / f'{run_key}_{file_key}'
+
+
+def load_meta(entry: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(entry / 'meta.json', 'r') as f:
+            meta = json.load(f)
+        os.utime(entry / 'meta.json') # the modification time orders the entries for LRU eviction
+    except (FileNotFoundError, ValueError):
+        return None
+    return meta
+
+
+def store_meta(entry: Path, meta: Dict[str, Any], max_size: float):
+    """Creates the entry of a run (removing stale entries of the same run) and writes its metadata."""
+    run_key = entry.name.split('_')[0]
+    for stale in entry.parent.glob(f'{run_key}_*'):
+        if stale != entry:
+            shutil.rmtree(stale, ignore_errors=True)
+    entry.mkdir(parents=True, exist_ok=True)
+    _write_atomic(entry / 'meta.json', lambda f: f.write(json.dumps(meta).encode()))
+    maybe_evict(entry.parent, max_size)
+
+
+def load_array(entry: Path, name: str) -> Optional[np.ndarray]:
+    try:
+        return np.load(entry / f'{name}.npy', mmap_mode='r')
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def store_array(entry: Path, name: str, value: np.ndarray):
+    if not (entry / 'meta.json').exists(): # evicted in the meantime
+        return
+    _write_atomic(entry / f'{name}.npy', lambda f: np.save(f, np.asarray(value)))
+
+
+def _write_atomic(path: Path, write):
+    # several processes may share the cache
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except FileNotFoundError: # entry removed in the meantime
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def evict(cache_dir: Path, max_size: float):
+    """Removes the least recently used entries until the cache is below max_size [MB]."""
+    global _last_eviction
+    _last_eviction = time.time()
+    cache_dir = Path(cache_dir)
+    if not cache_dir.is_dir():
+        return
+    entries = []
+    for entry in cache_dir.iterdir():
+        try:
+            size = sum(f.stat().st_size for f in entry.iterdir())
+            mtime = (entry / 'meta.json').stat().st_mtime if (entry / 'meta.json').exists() else entry.stat().st_mtime
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        entries.append((mtime, size, entry))
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in entries:
+        if total <= max_size * 1e6:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+
+
+def maybe_evict(cache_dir: Path, max_size: float):
+    # evicting scans the whole cache, so it is not done for every new entry
+    if time.time() - _last_eviction > eviction_interval:
+        evict(cache_dir, max_size)
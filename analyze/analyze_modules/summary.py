@@ -0,0 +1,79 @@
+import numpy as np
+from pathlib import Path
+from typing import Dict, Any, List
+
+from .catalog import parse_run_name
+
+# Reading of the summary table of per-run scalars (<output dir>/grid_summary.dat),
+# written by source/grid_summary.py and at the end of each coupled run. Whole-grid
+# scalar plots can be made from it without reading any profiles.
+
+SUMMARY_FILE = 'grid_summary.dat'
+
+
+def load_summary(base_folder: str or Path) -> Dict[str, np.ndarray]:
+    """
+    Columns of the summary table as arrays (one entry per run), plus the parameters
+    parsed from the run names (e.g. 'P0', 'Tint', 'CplusO', 'CtoO', 'noCond').
+    Parameters a run name does not contain are NaN.
+    """
+    path = Path(base_folder) / SUMMARY_FILE
+    columns = None
+    rows = {}
+    with open(path, 'r') as f:
+        for line in f:
+            values = line.split()
+            if line.startswith('#'):
+                columns = columns or values[1:]
+            elif columns is not None and len(values) == len(columns):
+                rows[values[0]] = values # the last row of a run is valid
+    if columns is None:
+        return {}
+
+    values = list(rows.values())
+    summary = {'name': np.array([v[0] for v in values], dtype=str)}
+    for k, column in enumerate(columns[1:], start=1):
+        if column == 'signature':
+            continue
+        dtype = int if column in ('n_iterations', 'converged') else float
+        summary[column] = np.array([v[k] for v in values], dtype=float).astype(dtype)
+    summary['converged'] = summary['converged'].astype(bool)
+
+    parsed = [parse_run_name(name) or {'planet': '', 'params': {}, 'noCond': False, 'add': ''} for name in summary['name']]
+    summary['planet'] = np.array([p['planet'] for p in parsed], dtype=str)
+    summary['noCond'] = np.array([p['noCond'] for p in parsed], dtype=bool)
+    for key in sorted({key for p in parsed for key in p['params']}):
+        summary[key] = np.array([p['params'].get(key, np.nan) for p in parsed])
+    return summary
+
+
+def summary_matrix(
+    summary: Dict[str, np.ndarray],
+    column: str,
+    param1_name: str,
+    param1_values: List[Any],
+    param2_name: str,
+    param2_values: List[Any],
+    **fixed_params
+) -> np.ndarray:
+    """
+    2D matrix (param1 x param2) of a summary column, e.g. for plot_2d_matrix.
+    fixed_params select the other parameters (e.g. P0=1e6, noCond=False).
+    NaN for missing and unconverged runs.
+    """
+    mask = np.ones(len(summary['name']), dtype=bool)
+    for key, value in fixed_params.items():
+        if summary[key].dtype.kind in 'fi':
+            mask &= np.isclose(summary[key], float(value), rtol=1e-5)
+        else:
+            mask &= summary[key] == value
+    mask &= summary['converged']
+
+    result = np.full((len(param1_values), len(param2_values)), np.nan)
+    for i, p1_val in enumerate(param1_values):
+        match1 = mask & np.isclose(summary[param1_name], float(p1_val), rtol=1e-5)
+        for j, p2_val in enumerate(param2_values):
+            match = match1 & np.isclose(summary[param2_name], float(p2_val), rtol=1e-5)
+            if np.any(match):
+                result[i, j] = summary[column][match][-1]
+    return result
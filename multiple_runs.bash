@@ -3,8 +3,10 @@
 # Script: multiple_runs.bash
 # Description: This script orchestrates multiple Chelio simulations by iterating
 #              over a defined grid of atmospheric and chemistry parameters.
-#              For each parameter combination, it calls 'run_coupled.bash'
-#              to execute a single coupled HELIOS-GGchem simulation.
+#              For each parameter combination, 'run_coupled.bash' is
+#              called (via source/run_grid.py) to execute a single coupled
+#              HELIOS-GGchem simulation. Up to N_WORKERS simulations run
+#              at the same time.
 #
 
 # --- Define Parameter Grid ---
@@ -21,44 +23,26 @@ CtoOs=(0.1 0.59 1.0)             # Carbon-to-Oxygen ratio
 # a_Ns=(1e-4 1e-2)                 # Nitrogen abundance (example)
 # ALBEDOs=(0.0 0.2 0.4 0.8)        # Surface Albedo (example)
 
+# Number of simulations run at the same time
+N_WORKERS=1
+
 # --- Run Parameter Grid ---
 
 # Base output directory relative to 'chelio'
 BASE_OUT_DIR="output/EqCond+Remove"
 
-# Create output directory if it does not exist
-mkdir -p "${BASE_OUT_DIR}"
-
 echo "Starting parameter grid exploration..."
 echo "Output will be saved in: ${BASE_OUT_DIR}/"
 
-for BOA_P in "${BOA_Ps[@]}"; do
-    for TEMP in "${TEMPs[@]}"; do
-        for CplusO in "${CplusOs[@]}"; do
-            for CtoO in "${CtoOs[@]}"; do
-                # Construct a unique name for this specific simulation run
-                # This name will also be used for its output subdirectory
-                SIM_NAME="Earth_P0=${BOA_P}_Tint=${TEMP}_CplusO=${CplusO}_CtoO=${CtoO}" #_aN=${a_N}" #_A=${ALBEDO}"
-
-                # Define the full path for the output directory for this run
-                # This directory will be created by 'run_coupled.bash'
-                CURRENT_OUT_DIR="${BASE_OUT_DIR}/${SIM_NAME}"
-
-                echo "--- Running simulation for: ${SIM_NAME} ---"
-
-                # Call run_coupled.bash with the specific parameters and output path
-                # Note: run_coupled.bash will need to be updated to accept OUT_DIR and NAME
-                bash run_coupled.bash \
-                    --BOA_P "${BOA_P}" \
-                    --TEMP "${TEMP}" \
-                    --CplusO "${CplusO}" \
-                    --CtoO "${CtoO}" \
-                    --OUT_DIR "${CURRENT_OUT_DIR}" \
-                    --NAME "${SIM_NAME}"
-
-            done
-        done
-    done
-done
+# Each run is saved in ${BASE_OUT_DIR}/Earth_P0=${BOA_P}_Tint=${TEMP}_CplusO=${CplusO}_CtoO=${CtoO}
+# Runs whose output already exists are skipped; progress and wall times are
+# logged to ${BASE_OUT_DIR}/grid_runner.log
+python3 source/run_grid.py \
+    --BOA_P "${BOA_Ps[@]}" \
+    --TEMP "${TEMPs[@]}" \
+    --CplusO "${CplusOs[@]}" \
+    --CtoO "${CtoOs[@]}" \
+    --OUT_DIR "${BASE_OUT_DIR}" \
+    --workers "${N_WORKERS}"
 
 echo "Parameter grid exploration complete!"
\ No newline at end of file
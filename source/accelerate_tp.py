@@ -0,0 +1,126 @@
+import numpy as np
+
+import argparse
+import os
+
+from create_pt import read_pt, interpolate_profile, write_pt
+
+# Acceleration of the HELIOS-GGchem fixed-point iteration in the T-P handoff.
+#
+# The coupling is a fixed-point iteration x = G(x): the T(P) profile x_{k-1}
+# given to GGchem determines the chemistry HELIOS uses in coupling iteration k,
+# whose output is g_k = G(x_{k-1}) ({NAME}_tp_coupling_{k}.dat). Without
+# acceleration the next input is simply x_k = g_k. Here x_k is instead mixed
+# from the stored history of inputs ({NAME}_tp_ggchem_{k}.dat, the initial
+# profile for k = -1) and outputs:
+#   relax:    x_k = x_{k-1} + alpha * f_k,  with the residual f_k = g_k - x_{k-1}
+#   aitken:   as relax, but with a relaxation factor updated each iteration
+#             from the last two residuals (Aitken's delta-squared method)
+#   anderson: Anderson mixing over the last `depth` residuals, mixing parameter alpha
+#
+# Usage (accelerate_step() is called by coupled_driver.py):
+#   python3 source/accelerate_tp.py --run_dir <dir> --name <NAME> --iteration <k> \
+#       --method anderson --out <work_dir>/structures/pt_helios.in
+
+methods = ['none', 'relax', 'aitken', 'anderson']
+
+omega_min = 0.1 # bounds of the Aitken relaxation factor
+omega_max = 1.5
+
+
+def load_history(run_dir, name, iteration):
+    """
+    Returns the pressure grid [bar] of iteration `iteration` and the histories of
+    GGchem inputs X[j] and HELIOS outputs G[j] on that grid (oldest first), starting
+    after the last failed HELIOS iteration.
+    """
+    P, _ = read_pt(os.path.join(run_dir, f'{name}_tp_coupling_{iteration}.dat'))
+    X, G = [], []
+    for j in range(iteration, -1, -1):
+        x_path = os.path.join(run_dir, f'{name}_tp_ggchem_{j-1}.dat')
+        if not os.path.isfile(x_path): # not accelerated: input was the HELIOS output
+            x_path = os.path.join(run_dir, f'{name}_tp_coupling_{j-1}.dat')
+        g_path = os.path.join(run_dir, f'{name}_tp_coupling_{j}.dat')
+        if not (os.path.isfile(x_path) and os.path.isfile(g_path)):
+            break
+        P_x, T_x = read_pt(x_path)
+        P_g, T_g = read_pt(g_path)
+        if np.all(T_x == 1.001) or np.all(T_g == 1.001): # dummy profile of a failed HELIOS run
+            break
+        X.insert(0, interpolate_profile(P_x, T_x, P))
+        G.insert(0, interpolate_profile(P_g, T_g, P))
+    return P, np.array(X), np.array(G)
+
+
+def relax(X, G, alpha=0.5):
+    return X[-1] + alpha * (G[-1] - X[-1])
+
+
+def aitken(X, G, alpha=0.5):
+    F = G - X
+    omega = alpha
+    for k in range(1, len(F)):
+        dF = F[k] - F[k-1]
+        norm = np.dot(dF, dF)
+        if norm > 0:
+            omega = -omega * np.dot(F[k-1], dF) / norm
+            omega = np.clip(omega, omega_min, omega_max)
+    return X[-1] + omega * F[-1]
+
+
+def anderson(X, G, alpha=0.5, depth=3):
+    F = G - X
+    m = min(depth, len(F) - 1)
+    if m == 0:
+        return relax(X, G, alpha)
+    dX = (X[-m:] - X[-m-1:-1]).T # (n_layers, m)
+    dF = (F[-m:] - F[-m-1:-1]).T
+    gamma = np.linalg.lstsq(dF, F[-1], rcond=None)[0]
+    return X[-1] + alpha * F[-1] - (dX + alpha * dF) @ gamma
+
+
+def accelerate(X, G, method='anderson', alpha=0.5, depth=3, Tmin=20):
+    if method == 'none' or len(G) == 0:
+        return G[-1]
+    if method == 'relax':
+        T = relax(X, G, alpha)
+    elif method == 'aitken':
+        T = aitken(X, G, alpha)
+    elif method == 'anderson':
+        T = anderson(X, G, alpha, depth)
+        if not np.all(np.isfinite(T)):
+            T = relax(X, G, alpha)
+    else:
+        raise ValueError(f"Unknown acceleration method '{method}'")
+    return np.maximum(T, Tmin)
+
+
+def accelerate_step(run_dir, name, iteration, out, method='anderson', alpha=0.5, depth=3, Tmin=20):
+    """Writes the next GGchem input after coupling iteration `iteration` to `out` and archives it."""
+    P, X, G = load_history(run_dir, name, iteration)
+    if len(G) == 0: # failed HELIOS iteration, pass the profile on unchanged
+        P, T = read_pt(os.path.join(run_dir, f'{name}_tp_coupling_{iteration}.dat'))
+    else:
+        T = accelerate(X, G, method=method, alpha=alpha, depth=depth, Tmin=Tmin)
+        print(f'T(P) acceleration ({method}, {len(G)} iterations of history): '
+              f'max. change w.r.t. HELIOS output {np.max(np.abs(T - G[-1])):.3g} K')
+
+    write_pt(out, P, T)
+    write_pt(os.path.join(run_dir, f'{name}_tp_ggchem_{iteration}.dat'), P, T)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mix the next GGchem T(P) input from the coupling history.')
+    parser.add_argument('--run_dir', type=str, required=True, help='Output directory of the run')
+    parser.add_argument('--name', type=str, required=True, help='Name of the run')
+    parser.add_argument('--iteration', type=int, required=True, help='Coupling iteration HELIOS has just finished')
+    parser.add_argument('--method', choices=methods, default='anderson', help='Acceleration method')
+    parser.add_argument('--alpha', type=float, default=0.5, help='Relaxation/mixing parameter')
+    parser.add_argument('--depth', type=int, default=3, help='Number of previous iterations used for Anderson mixing')
+    parser.add_argument('--Tmin', type=float, default=20, help='Minimum temperature [K]')
+    parser.add_argument('--out', type=str, required=True, help='GGchem structure file to write')
+
+    args = parser.parse_args()
+
+    accelerate_step(args.run_dir, args.name, args.iteration, args.out,
+                    method=args.method, alpha=args.alpha, depth=args.depth, Tmin=args.Tmin)
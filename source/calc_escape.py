@@ -1,9 +1,13 @@
 # calc_escape.py
 import argparse
 import os
+import time
 import traceback
 import numpy as np
-from scipy.interpolate import interp1d
+from concurrent.futures import ProcessPoolExecutor
+
+from ggchem_io import read_table
+from iterations import scan_iterations, last_iteration
 
 # --- Constants (cgs units) ---
 G = 6.674e-8  # cm^3 g^-1 s^-2
@@ -59,53 +63,51 @@ def escape_rate(r_c, P_c, T_c, m_P, mu, B=0.65):
     return lambda_c, phi_jeans
 
 def find_last_iteration(folder_path, file_prefix):
-    i = 0
-    last_i = 0
-    while True:
-        file_path = os.path.join(folder_path, f"{file_prefix}{i}.dat")
-        if not os.path.exists(file_path):
-            break
-        last_i = i
-        i += 1
-    return last_i
+    # last of the consecutive iterations 0, 1, 2, ... (0 if there is none)
+    iterations = scan_iterations(folder_path)._asdict()[file_prefix.rstrip('_').lower()]
+    return max(last_iteration(iterations), 0)
+
+def planet_mass_radius(folder_name):
+    planet_name = folder_name.split('_')[0] # Assumes planet name is before the first "_"
+    if planet_name in planet_properties:
+        return planet_name, planet_properties[planet_name]["mass"], planet_properties[planet_name]["radius"]
+    print(f"Warning: Planet name '{planet_name}' not found in planet properties. Using Earth properties.")
+    return planet_name, m_Earth, r_Earth
 
-def calculate_escape_parameters(folder_path, folder_name):
+def load_profiles(folder_path, folder_name):
+    """Profiles of the last iteration of a run needed for the escape calculation (only the needed columns are read)."""
     # 1. Data Extraction
-    i_max_static = find_last_iteration(os.path.join(folder_path, folder_name), "Static_Conc_")
-    i_max_vertical_mix = find_last_iteration(os.path.join(folder_path, folder_name), "vertical_mix_")
+    iterations = scan_iterations(os.path.join(folder_path, folder_name)) # one directory listing for both files
+    i_max_static = max(last_iteration(iterations.static_conc), 0)
+    i_max_vertical_mix = max(last_iteration(iterations.vertical_mix), 0)
     static_data_path = os.path.join(folder_path, folder_name, f"Static_Conc_{i_max_static}.dat")
     vertical_mix_path = os.path.join(folder_path, folder_name, f"vertical_mix_{i_max_vertical_mix}.dat")
     tp_data_path = os.path.join(folder_path, folder_name, f"{folder_name}_tp.dat")
 
-    # Load data using np.loadtxt, skip header and dimension lines (4 rows)
+    # Load data from the binary sidecars if available (else np.loadtxt), skip header and dimension lines (3 rows)
     try:
-        static_data = np.loadtxt(static_data_path, skiprows=3) # altitude (cm) in column 0, pressure (dyn/cm^2) in column 2, Temp (K) in column 2, nHtot in column 1
-        vertical_mix_mu = np.loadtxt(vertical_mix_path, skiprows=1) # mu in column 3, skip 2 header rows
+        _, static_data = read_table(static_data_path, 3, usecols=[0, 2]) # Temp (K) in column 0, pressure (dyn/cm^2) in column 2
+        _, vertical_mix_mu = read_table(vertical_mix_path, 1, usecols=[2, 3]) # nHtot in column 2, mu in column 3, skip 1 header row
         tp_data_alt = np.loadtxt(tp_data_path, skiprows=2, usecols=3) # altitude (cm) in column 3
     except FileNotFoundError as e:
         raise FileNotFoundError(f"Could not find data file: {e}")
     except ValueError as e: # Catch errors during data loading (e.g., wrong skiprows)
         raise ValueError(f"Error loading data from file: {e}. Check file format and skiprows settings.")
 
-    altitudes = tp_data_alt[:] # cm
-    pressures_dyn_cm2 = static_data[:, 2] # dyn/cm^2 (column index 2)
-    temperatures = static_data[:, 0] # K (column index 2)
-    n_tots = vertical_mix_mu[:, 2] # nHtot values
-    mu = vertical_mix_mu[:, 3] # mu values
-
     # 1b. Planetary Properties from folder name
-    planet_name = folder_name.split('_')[0] # Assumes planet name is before the first "_"
-    if planet_name in planet_properties:
-        m_P = planet_properties[planet_name]["mass"]
-        r_P = planet_properties[planet_name]["radius"]
-    else:
-        print(f"Warning: Planet name '{planet_name}' not found in planet properties. Using Earth properties.")
-        m_P = m_Earth
-        r_P = r_Earth
-
-    radius = altitudes + r_P # cm
+    planet_name, m_P, r_P = planet_mass_radius(folder_name)
+
+    return {
+        "planet_name": planet_name, "m_P": m_P, "r_P": r_P,
+        "radius": tp_data_alt + r_P, # cm
+        "pressures_dyn_cm2": np.array(static_data[:, 1]), # dyn/cm^2
+        "temperatures": np.array(static_data[:, 0]), # K
+        "n_tots": np.array(vertical_mix_mu[:, 0]), # nHtot values
+        "mu": np.array(vertical_mix_mu[:, 1]), # mu values
+    }
 
-    # 2. Exobase Calculation (interpolation and masked pressure)
+def extend_to_exobase(radius, pressures_dyn_cm2, temperatures, mu, n_tots, m_P, verbose=True):
+    """Extends the profiles isothermally above the top layer until the exobase (mfp = scale height) is reached."""
     mfp = get_mfp(pressures_dyn_cm2, temperatures, kin_dia_H2) # mean free path
     scale_height = get_scale_height(radius, temperatures, m_P, mu) # scale height
     r_c_values = r_exobase(pressures_dyn_cm2, m_P, mu, kin_dia_H2) # exobase radius
@@ -114,61 +116,162 @@ def calculate_escape_parameters(folder_path, folder_name):
         # approximate P at exobase
         approx_P = r_c_values[-1]**2 * pressures_dyn_cm2[-1] / (radius[-1]**2)
         approx_P = 10**np.floor(np.log10(approx_P))
-        print(f"Extending profile to P = {approx_P} dyn/cm^2")
+        if verbose:
+            print(f"Extending profile to P = {approx_P} dyn/cm^2")
         # extend profiles to new P
         radius, pressures_dyn_cm2, temperatures, mu, n_tots = extend_profile(radius, pressures_dyn_cm2, temperatures, approx_P, mu, m_P, n_tots)
-        altitudes = radius - r_P
         # recalculate mfp, scale height, and exobase radius
         mfp = get_mfp(pressures_dyn_cm2, temperatures, kin_dia_H2)
         scale_height = get_scale_height(radius, temperatures, m_P, mu)
         r_c_values = r_exobase(pressures_dyn_cm2, m_P, mu, kin_dia_H2)
+    return radius, pressures_dyn_cm2, temperatures, mu, n_tots
+
+def run_profiles(folder_path, folder_name, extension='analytic', verbose=True):
+    """
+    Profiles of a run. With extension='loop', they are extended up to the exobase
+    (extend_to_exobase); with 'analytic', find_exobase solves for an exobase above the top.
+    """
+    profiles = load_profiles(folder_path, folder_name)
+    if extension == 'loop':
+        keys = ["radius", "pressures_dyn_cm2", "temperatures", "mu", "n_tots"]
+        extended = extend_to_exobase(*(profiles[k] for k in keys), profiles["m_P"], verbose=verbose)
+        profiles.update(zip(keys, extended))
+    elif extension != 'analytic':
+        raise ValueError(f"Unknown profile extension '{extension}' (use 'analytic' or 'loop')")
+    return profiles
+
+def pad_profiles(profiles_list, key):
+    """Profiles of several runs as one array (n_runs, n_max), padded with NaN."""
+    n_max = max(len(p[key]) for p in profiles_list)
+    padded = np.full((len(profiles_list), n_max), np.nan)
+    for k, p in enumerate(profiles_list):
+        padded[k, :len(p[key])] = p[key]
+    return padded
+
+def locate_exobase(radius, pressures_dyn_cm2, temperatures, n_tots, mu, m_P, kin_dia=kin_dia_H2):
+    """
+    Exobase (mfp = scale height) of one or several runs at once: profiles of shape
+    (n_layers,) or (n_runs, n_layers), padded with NaN, m_P and kin_dia of shape () or (n_runs,).
+    Quantities at the exobase are interpolated linearly in radius (pressure and density in log).
+    """
+    m_P = np.asarray(m_P, dtype=float)[..., np.newaxis]
+    kin_dia = np.asarray(kin_dia, dtype=float)[..., np.newaxis]
+    # 2. Exobase Calculation (interpolation and masked pressure)
+    mfp = get_mfp(pressures_dyn_cm2, temperatures, kin_dia) # mean free path
+    scale_height = get_scale_height(radius, temperatures, m_P, mu) # scale height
+    r_c_values = r_exobase(pressures_dyn_cm2, m_P, mu, kin_dia) # exobase radius
 
-    # Interpolate functions
-    f_rc = interp1d(radius, r_c_values, bounds_error=False, fill_value="extrapolate") # r_c as function of altitude
-    f_P = interp1d(radius, np.log10(pressures_dyn_cm2), bounds_error=False, fill_value="extrapolate") # pressure in dyn/cm^2
-    f_T = interp1d(radius, temperatures, bounds_error=False, fill_value="extrapolate")
-    f_n = interp1d(radius, np.log10(n_tots), bounds_error=False, fill_value="extrapolate")
-    f_mu = interp1d(radius, mu, bounds_error=False, fill_value="extrapolate")
+    # get exobase radius: first layer above it (NaN padding never counts)
+    n_valid = np.sum(~np.isnan(radius), axis=-1, keepdims=True)
+    i_exo = np.clip(np.sum(mfp < scale_height, axis=-1, keepdims=True), 1, n_valid - 1)
+    lower = lambda a: np.take_along_axis(a, i_exo - 1, axis=-1)[..., 0]
+    upper = lambda a: np.take_along_axis(a, i_exo, axis=-1)[..., 0]
 
-    # get exobase radius
-    i_exo = np.sum(mfp < scale_height)
     # interpolate exobase radius where mfp == scale height
-    dsh = scale_height[i_exo] - scale_height[i_exo-1]
-    dmfp = mfp[i_exo] - mfp[i_exo-1]
-    dr = radius[i_exo] - radius[i_exo-1]
-    r_exo = radius[i_exo-1] + (scale_height[i_exo-1] - mfp[i_exo-1]) * dr / (dmfp - dsh)
+    dsh = upper(scale_height) - lower(scale_height)
+    dmfp = upper(mfp) - lower(mfp)
+    dr = upper(radius) - lower(radius)
+    r_exo = lower(radius) + (lower(scale_height) - lower(mfp)) * dr / (dmfp - dsh)
+
+    weight = (r_exo - lower(radius)) / dr
+    interpolate = lambda a: lower(a) + weight * (upper(a) - lower(a))
+    return {
+        "r_exo": r_exo,
+        "r_c": interpolate(r_c_values),
+        "P_c": 10**interpolate(np.log10(pressures_dyn_cm2)),
+        "T_c": interpolate(temperatures),
+        "n_c": 10**interpolate(np.log10(n_tots)),
+        "mu_c": interpolate(mu),
+        "P_surface": pressures_dyn_cm2[..., 0],
+    }
 
-    #print(f"Exobase altitude: {r_exo:.2e} cm")
-    #print(f"Exobase radius: {f_rc(r_exo):.2e} cm")
+def isothermal_exobase(r_surface, r_top, P_top, T_top, mu_top, m_P, kin_dia=kin_dia_H2, n_newton=50):
+    """
+    Exobase above the top layer for an isothermal extension (T and mu of the top layer,
+    gravity of the surface as in extend_profile), for arrays over runs. With x = ln(P_top/P),
+    r(x) = r_top + H x and mfp = scale height where r = r_c(P) = r_c_top exp(x/2). For
+    mfp < scale height at the top, f(x) = r(x) - r_c(x) > 0 at x = 0 and f is concave, so the
+    single root is found by Newton steps from a bracket above it (monotone convergence).
+    """
+    gravity = G * m_P / r_surface**2
+    H = kB * T_top / (mu_top * m_H * gravity) # pressure scale height of the extension
+    rc_top = r_exobase(P_top, m_P, mu_top, kin_dia)
+    f = lambda x: r_top + H * x - rc_top * np.exp(x / 2)
+
+    # bracket: f(x_hi) < 0, starting from the pressure estimate of extend_to_exobase
+    x_hi = np.maximum(2 * np.log(r_top / rc_top), 1.0)
+    for _ in range(100):
+        positive = f(x_hi) >= 0
+        if not np.any(positive):
+            break
+        x_hi = np.where(positive, 2 * x_hi, x_hi)
 
-    r_c = f_rc(r_exo)
-    P_c = 10**f_P(r_exo)
-    T_c = f_T(r_exo)
-    n_c = 10**f_n(r_exo)
-    mu_c = f_mu(r_exo)
+    x = x_hi
+    for _ in range(n_newton):
+        step = f(x) / (H - rc_top / 2 * np.exp(x / 2))
+        x = x - step
+        if np.all(np.abs(step) <= 1e-12 * np.abs(x)):
+            break
 
-    #print(r_c, P_c, T_c, n_c, mu_c)
+    P_c = P_top * np.exp(-x)
+    r_exo = r_top + H * x
+    return {
+        "r_exo": r_exo,
+        "r_c": r_exobase(P_c, m_P, mu_top, kin_dia),
+        "P_c": P_c,
+        "T_c": T_top,
+        "n_c": P_c / (kB * T_top), # ideal gas, as the densities of extend_profile
+        "mu_c": mu_top,
+    }
+
+def find_exobase(radius, pressures_dyn_cm2, temperatures, n_tots, mu, m_P, kin_dia=kin_dia_H2):
+    """
+    Exobase of one or several runs (profiles as for locate_exobase): interpolated in the
+    profile, or from isothermal_exobase for runs where it lies above the top layer.
+    """
+    exobase = locate_exobase(radius, pressures_dyn_cm2, temperatures, n_tots, mu, m_P, kin_dia)
+    radius, pressures_dyn_cm2, temperatures, mu = (np.atleast_2d(a) for a in (radius, pressures_dyn_cm2, temperatures, mu))
+    m_P = np.broadcast_to(m_P, radius.shape[:1])
+    kin_dia = np.broadcast_to(kin_dia, radius.shape[:1])
+    i_top = np.sum(~np.isnan(radius), axis=-1, keepdims=True) - 1
+    top = lambda a: np.take_along_axis(a, i_top, axis=-1)[:, 0]
+
+    above = get_mfp(top(pressures_dyn_cm2), top(temperatures), kin_dia) < get_scale_height(top(radius), top(temperatures), m_P, top(mu))
+    if np.any(above):
+        iso = isothermal_exobase(radius[above, 0], top(radius)[above], top(pressures_dyn_cm2)[above],
+                                 top(temperatures)[above], top(mu)[above], m_P[above], kin_dia[above])
+        for key, value in iso.items():
+            values = np.atleast_1d(np.array(exobase[key], dtype=float))
+            values[above] = value
+            exobase[key] = values if np.ndim(exobase[key]) else values[0]
+    return exobase
+
+def escape_parameters(exobase, m_P, r_P, B=0.65):
+    """Thermal escape condition, Jeans escape and escape timescale (arrays over runs or scalars)."""
+    r_c, P_c, T_c, mu_c = exobase["r_c"], exobase["P_c"], exobase["T_c"], exobase["mu_c"]
 
     # 3. Thermal Escape Condition
     T_max_exo = maxTexo(m_P, r_P, mu_c)
-    #print(f"Max T_exo: {T_max_exo:.2f} K")
     thermal_escape_condition = T_c > T_max_exo
 
     # 4. Jeans Escape Rate and Timescale
-    lambda_c, phi_jeans = escape_rate(r_c, P_c, T_c, m_P, mu_c) # Jeans escape rate in [mol cm^-2 s^-1]
+    lambda_c, phi_jeans = escape_rate(r_c, P_c, T_c, m_P, mu_c, B) # Jeans escape rate in [mol cm^-2 s^-1]
     phi_jeans_tot = phi_jeans * 4 * np.pi * r_c**2 # total Jeans escape rate in [mol s^-1] (molecule per second)
     escape_time = 1 / phi_jeans_tot * avogadro / mu_c # escape timescale in s/g
     escape_time_yrs = escape_time / (60*60*24*365.25) # escape timescale in years/g
 
     grav = G * m_P / r_P**2 # cm/s^2
-    M_atmo = pressures_dyn_cm2[0] * 4 * np.pi * r_c**2 / grav # g
+    M_atmo = exobase["P_surface"] * 4 * np.pi * r_c**2 / grav # g
     escape_time_atmo_yrs = escape_time_yrs * M_atmo # years
-    print(escape_time_atmo_yrs.shape)
-    print('Rough time until escape of entire atmosphere:')
-    print(f'{escape_time_atmo_yrs:.2e} years')
+    return {
+        "thermal_escape_condition": thermal_escape_condition,
+        "lambda_c": lambda_c,
+        "phi_jeans": phi_jeans,
+        "escape_time_atmo_yrs": escape_time_atmo_yrs,
+    }
 
+def write_escape_file(output_path, planet_name, r_exo, r_c, P_c, T_c, n_c, thermal_escape_condition, lambda_c, phi_jeans, escape_time_atmo_yrs):
     # 5. Save Results to escape.dat
-    output_path = os.path.join(folder_path, folder_name, "escape.dat")
     with open(output_path, 'w') as f:
         f.write(f"Planet Name: {planet_name}\n")
         f.write(f"Exobase Altitude [cm]: {r_exo:.4e}\n")
@@ -181,21 +284,168 @@ def calculate_escape_parameters(folder_path, folder_name):
         f.write(f"Jeans Escape Rate [cm^-2 s^-1]: {phi_jeans:.4e}\n")
         f.write(f"Escape Timescale of entire Atmosphere [years]: {escape_time_atmo_yrs:.2e}\n")
 
+def calculate_escape_parameters(folder_path, folder_name, extension='analytic'):
+    profiles = run_profiles(folder_path, folder_name, extension)
+    exobase = find_exobase(profiles["radius"], profiles["pressures_dyn_cm2"], profiles["temperatures"],
+                             profiles["n_tots"], profiles["mu"], profiles["m_P"])
+    escape = escape_parameters(exobase, profiles["m_P"], profiles["r_P"])
+    print('Rough time until escape of entire atmosphere:')
+    print(f'{escape["escape_time_atmo_yrs"]:.2e} years')
+
+    write_escape_file(os.path.join(folder_path, folder_name, "escape.dat"), profiles["planet_name"], exobase["r_exo"],
+                      exobase["r_c"], exobase["P_c"], exobase["T_c"], exobase["n_c"], escape["thermal_escape_condition"],
+                      escape["lambda_c"], escape["phi_jeans"], escape["escape_time_atmo_yrs"])
+
     return { # Return a dictionary for potential further use
-        "r_c": r_c,
-        "P_c": P_c,
-        "T_c": T_c,
-        "n_c": n_c,
-        "thermal_escape_condition": thermal_escape_condition,
-        "lambda_c": lambda_c,
-        "phi_jeans": phi_jeans,
-        "escape_time_atmo_yrs": escape_time_atmo_yrs
+        "r_c": exobase["r_c"],
+        "P_c": exobase["P_c"],
+        "T_c": exobase["T_c"],
+        "n_c": exobase["n_c"],
+        "thermal_escape_condition": escape["thermal_escape_condition"],
+        "lambda_c": escape["lambda_c"],
+        "phi_jeans": escape["phi_jeans"],
+        "escape_time_atmo_yrs": escape["escape_time_atmo_yrs"]
     }
 
+def _load_run(folder_path, folder_name, extension='analytic'):
+    # worker of batch_escape: profiles of a run, or the error message
+    try:
+        return run_profiles(folder_path, folder_name, extension, verbose=False), None
+    except FileNotFoundError as e:
+        return None, f"Warning: Could not process folder {folder_name}: {e}"
+    except Exception:
+        return None, f"Error processing folder {folder_name}:\n{traceback.format_exc()}"
+
+def batch_escape(main_folder_path, workers=1, extension='analytic'):
+    """
+    Escape parameters of all runs in main_folder_path: the profiles are read on a pool of
+    `workers` processes, the exobases of all runs are then located at once. Writes escape.dat
+    of each run and summary_escape.dat. Returns the run names, lambda_c and escape timescales.
+    extension: 'analytic' (isothermal_exobase) or 'loop' (extend_to_exobase) above the top layer.
+    """
+    folder_names = sorted(f for f in os.listdir(main_folder_path) if os.path.isdir(os.path.join(main_folder_path, f)))
+    start = time.time()
+    if workers > 1 and len(folder_names) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_load_run, [main_folder_path]*len(folder_names), folder_names, [extension]*len(folder_names),
+                                        chunksize=max(1, len(folder_names) // (4*workers))))
+    else:
+        results = [_load_run(main_folder_path, f, extension) for f in folder_names]
+
+    names, profiles_list = [], []
+    for folder_name, (profiles, error) in zip(folder_names, results):
+        if error is not None:
+            print(error)
+        else:
+            names.append(folder_name)
+            profiles_list.append(profiles)
+    if not names:
+        return names, np.array([]), np.array([])
+
+    m_P = np.array([p["m_P"] for p in profiles_list])
+    r_P = np.array([p["r_P"] for p in profiles_list])
+    exobase = find_exobase(*(pad_profiles(profiles_list, k) for k in ["radius", "pressures_dyn_cm2", "temperatures", "n_tots", "mu"]), m_P)
+    escape = escape_parameters(exobase, m_P, r_P)
+
+    for k, folder_name in enumerate(names):
+        write_escape_file(os.path.join(main_folder_path, folder_name, "escape.dat"), profiles_list[k]["planet_name"],
+                          *(exobase[q][k] for q in ["r_exo", "r_c", "P_c", "T_c", "n_c"]),
+                          *(escape[q][k] for q in ["thermal_escape_condition", "lambda_c", "phi_jeans", "escape_time_atmo_yrs"]))
+
+    output_path = os.path.join(main_folder_path, "summary_escape.dat")
+    with open(output_path, 'w') as f:
+        for i in range(len(names)):
+            f.write(f"{names[i]} {escape['lambda_c'][i]:.4e} {escape['escape_time_atmo_yrs'][i]:.4e}\n")
+    print(f"Escape parameters of {len(names)} runs saved in {time.time() - start:.2f} s with {workers} worker(s)")
+    return names, escape["lambda_c"], escape["escape_time_atmo_yrs"]
+
+
+def sample_parameters(n_samples, sigma_kin_dia=0.05, B_range=(0.5, 0.8), sigma_mass=0.0, sigma_radius=0.0, seed=0):
+    """
+    Ensemble of the uncertain escape parameters: kinetic diameter, planet mass and radius as
+    log-normal factors (relative widths sigma_*) on their nominal values, B uniform in B_range.
+    The same samples are used for all runs, so differences between runs are not sampling noise.
+    """
+    rng = np.random.default_rng(seed)
+    return {
+        "kin_dia_factor": np.exp(sigma_kin_dia * rng.standard_normal(n_samples)),
+        "B": rng.uniform(B_range[0], B_range[1], n_samples),
+        "mass_factor": np.exp(sigma_mass * rng.standard_normal(n_samples)),
+        "radius_factor": np.exp(sigma_radius * rng.standard_normal(n_samples)),
+    }
+
+def escape_ensemble(profiles, samples):
+    """
+    Escape parameters of one run (profiles of load_profiles, not extended) for all samples at
+    once: the profile is broadcast to (n_samples, n_layers) and the exobase found with find_exobase.
+    The altitudes (hydrostatic for the nominal gravity, taken as constant) are rescaled with
+    the scale height, i.e. by g_nominal/g_sample = (m_nominal/m_sample)*(r_sample/r_nominal)^2.
+    """
+    n_samples = len(samples["B"])
+    m_P = profiles["m_P"] * samples["mass_factor"]
+    r_P = profiles["r_P"] * samples["radius_factor"]
+    shape = (n_samples, len(profiles["radius"]))
+    gravity_ratio = samples["radius_factor"]**2 / samples["mass_factor"] # g_nominal/g_sample
+    altitudes = profiles["radius"] - profiles["r_P"]
+    radius = altitudes * gravity_ratio[:, np.newaxis] + r_P[:, np.newaxis] # altitudes on the sampled planet
+    P, T, n, mu = (np.broadcast_to(profiles[k], shape) for k in ["pressures_dyn_cm2", "temperatures", "n_tots", "mu"])
+    exobase = find_exobase(radius, P, T, n, mu, m_P, kin_dia_H2 * samples["kin_dia_factor"])
+    return escape_parameters(exobase, m_P, r_P, samples["B"])
+
+def write_escape_mc_file(output_path, escape, percentiles):
+    with open(output_path, 'w') as f:
+        f.write(f"# Monte Carlo escape parameters, {len(escape['lambda_c'])} samples\n")
+        f.write("# quantity " + " ".join(f"p{q:g}" for q in percentiles) + "\n")
+        for key in ["lambda_c", "escape_time_atmo_yrs"]:
+            values = np.percentile(escape[key], percentiles, method='nearest') # escape times can be inf
+            f.write(f"{key} " + " ".join(f"{v:.4e}" for v in values) + "\n")
+        f.write(f"thermal_escape_fraction {np.mean(escape['thermal_escape_condition']):.4f}\n")
+
+def batch_escape_mc(main_folder_path, samples, percentiles=(5, 16, 50, 84, 95), workers=1):
+    """
+    Escape uncertainties of all runs in main_folder_path from the parameter ensemble `samples`
+    (see sample_parameters), with the analytic exobase above the top layer. Writes escape_mc.dat
+    of each run (percentiles of lambda_c and the escape time, fraction of samples with thermal
+    escape) and summary_escape_mc.dat (run name, percentiles of the escape time in years).
+    """
+    folder_names = sorted(f for f in os.listdir(main_folder_path) if os.path.isdir(os.path.join(main_folder_path, f)))
+    start = time.time()
+    if workers > 1 and len(folder_names) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_load_run, [main_folder_path]*len(folder_names), folder_names,
+                                        chunksize=max(1, len(folder_names) // (4*workers))))
+    else:
+        results = [_load_run(main_folder_path, f) for f in folder_names]
+
+    lines = []
+    for folder_name, (profiles, error) in zip(folder_names, results):
+        if error is not None:
+            print(error)
+            continue
+        escape = escape_ensemble(profiles, samples)
+        write_escape_mc_file(os.path.join(main_folder_path, folder_name, "escape_mc.dat"), escape, percentiles)
+        values = np.percentile(escape["escape_time_atmo_yrs"], percentiles, method='nearest')
+        lines.append(f"{folder_name} " + " ".join(f"{v:.4e}" for v in values) + "\n")
+
+    with open(os.path.join(main_folder_path, "summary_escape_mc.dat"), 'w') as f:
+        f.write("# name " + " ".join(f"t_p{q:g}[yr]" for q in percentiles) + "\n")
+        f.writelines(lines)
+    print(f"Escape uncertainties of {len(lines)} runs ({len(samples['B'])} samples each) saved in {time.time() - start:.2f} s")
+    return len(lines)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Calculate atmospheric escape parameters.")
     parser.add_argument("folder_path", help="Path to the main folder containing subfolders.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of parallel processes reading the runs")
+    parser.add_argument("--extension", choices=["analytic", "loop"], default="analytic",
+                        help="Exobase above the top layer: closed isothermal solution (default) or the stepwise profile extension")
+    parser.add_argument("--mc", type=int, default=0, help="Also compute escape uncertainties from this many Monte Carlo samples per run")
+    parser.add_argument("--sigma_kin_dia", type=float, default=0.05, help="Monte Carlo: relative (log-normal) uncertainty of the kinetic diameter of H2")
+    parser.add_argument("--B_range", type=float, nargs=2, default=[0.5, 0.8], help="Monte Carlo: range of the factor B of the Jeans escape rate (uniform)")
+    parser.add_argument("--sigma_mass", type=float, default=0.0, help="Monte Carlo: relative (log-normal) uncertainty of the planet mass")
+    parser.add_argument("--sigma_radius", type=float, default=0.0, help="Monte Carlo: relative (log-normal) uncertainty of the planet radius")
+    parser.add_argument("--percentiles", type=float, nargs='+', default=[5, 16, 50, 84, 95], help="Monte Carlo: percentiles written per run")
+    parser.add_argument("--seed", type=int, default=0, help="Monte Carlo: seed of the random samples")
     args = parser.parse_args()
     main_folder_path = args.folder_path
 
@@ -203,48 +453,21 @@ if __name__ == "__main__":
         print(f"Error: Folder path '{main_folder_path}' is not a valid directory.")
         exit(1)
 
-    processed_folders = 0
-    names = []
-    summary_lambda_c = []
-    summary_escape_time = []
-
-    for folder_name in os.listdir(main_folder_path):
-        subfolder_path = os.path.join(main_folder_path, folder_name)
-        if os.path.isdir(subfolder_path): # Check if it's a directory
-            try:
-                print(f"Processing folder: {folder_name}")
-                escape_results = calculate_escape_parameters(main_folder_path, folder_name)
-                names.append(folder_name)
-                summary_lambda_c.append(escape_results["lambda_c"])
-                summary_escape_time.append(escape_results["escape_time_atmo_yrs"])
-                print(f"Escape parameters saved to {folder_name}/escape.dat")
-                processed_folders += 1
-            except FileNotFoundError as e:
-                print(f"Warning: Could not process folder {folder_name}: {e}")
-            except ValueError as e:
-                print(f"Error processing folder {folder_name}:")
-                # print type of error, line number, and error message
-                print(traceback.format_exc())
-            except Exception as e:
-                print(f"Error processing folder {folder_name}:")
-                print(traceback.format_exc())
-    
-    if processed_folders > 0:
-        summary_lambda_c = np.array(summary_lambda_c)
+    names, summary_lambda_c, summary_escape_time = batch_escape(main_folder_path, workers=args.workers, extension=args.extension)
+
+    if len(names) > 0:
         print(f"Summary of Jeans Escape Parameters:")
         print(f"Min: {names[np.argmin(summary_lambda_c)]} - {np.min(summary_lambda_c):.2e}")
         print(f"Max: {names[np.argmax(summary_lambda_c)]} - {np.max(summary_lambda_c):.2e}")
         print(f"Mean: {np.mean(summary_lambda_c):.2e}")
-        summary_escape_time = np.array(summary_escape_time)
         print(f"Summary of Escape Timescales:")
         print(f"Min: {names[np.argmin(summary_escape_time)]} - {np.min(summary_escape_time):.2e} years")
         print(f"Max: {names[np.argmax(summary_escape_time)]} - {np.max(summary_escape_time):.2e} years")
         print(f"Mean: {np.mean(summary_escape_time):.2e} years")
+    else:
+        print("Warning: No folders with simulation data found in the provided path.")
 
-        output_path = os.path.join(main_folder_path, "summary_escape.dat")
-        with open(output_path, 'w') as f:
-            for i in range(len(names)):
-                f.write(f"{names[i]} {summary_lambda_c[i]:.4e} {summary_escape_time[i]:.4e}\n")
-
-    if processed_folders == 0:
-        print("Warning: No folders with simulation data found in the provided path.")
\ No newline at end of file
+    if args.mc > 0:
+        samples = sample_parameters(args.mc, sigma_kin_dia=args.sigma_kin_dia, B_range=args.B_range,
+                                    sigma_mass=args.sigma_mass, sigma_radius=args.sigma_radius, seed=args.seed)
+        batch_escape_mc(main_folder_path, samples, percentiles=args.percentiles, workers=args.workers)
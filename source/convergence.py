@@ -0,0 +1,170 @@
+import numpy as np
+
+import argparse
+import os
+
+from create_pt import read_pt, interpolate_profile
+from ggchem_io import read_static_conc, log_vmr, interpolate_static_conc
+
+# Chelio-side convergence control of the HELIOS-GGchem coupling.
+#
+# After HELIOS has finished coupling iteration i, the change of T(P) with
+# respect to the previous iteration ({NAME}_tp_coupling_{i} vs. _{i-1}) and the
+# change of the VMRs of key species (Static_Conc_{i} vs. Static_Conc_{i-1}) are
+# computed and appended to {NAME}_chelio_convergence.dat. Based on this history
+#   - the coupling is stopped once all changes are below the tolerances,
+#   - runs whose T(P) changes grow from iteration to iteration (the pattern
+#     mark_bad_last_iters.py detects afterwards) are flagged and stopped,
+#   - the HELIOS iteration budget of the next coupling iteration is chosen
+#     according to how close the run is to convergence,
+#   - iterations without a valid HELIOS profile (e.g. the dummy profile of a
+#     failed HELIOS run) are reported as failed; the budget is then left to
+#     the defaults of coupled_driver.py.
+#
+# Usage (after HELIOS has finished iteration i, as in coupled_driver.py):
+#   result = check_iteration(run_dir, name, i, tol_T=0.5, tol_vmr=0.01)
+#   print_report(result)
+#   if result['stop']: ...  # next budget: result['max_iter'] (None if failed), result['speed_up']
+# For a single check from the command line:
+#   python3 source/convergence.py --run_dir <dir> --name <NAME> --iteration <i>
+
+key_species = ['H2O', 'CH4', 'CO', 'CO2', 'H2']
+
+# HELIOS iteration budgets (as used by coupled_driver.py)
+max_iter_first = 1000 # relaxed, far from convergence
+max_iter_intermediate = 10000
+max_iter_full = 30000 # tightest convergence
+
+history_columns = ['iteration', 'dT_rms[K]', 'dT_max[K]', 'dvmr_rms[dex]', 'dvmr_max[dex]', 'max_iter_next', 'stop', 'oscillating']
+
+
+def profile_change(P_new, T_new, P_old, T_old):
+    """RMS and maximum absolute change of T(P) [K] on the new pressure grid."""
+    if np.all(T_new == 1.001) or np.all(T_old == 1.001): # dummy profile of a failed HELIOS run
+        return np.nan, np.nan
+    if len(P_new) != len(P_old) or not np.allclose(P_new, P_old):
+        T_old = interpolate_profile(P_old, T_old, P_new)
+    dT = np.abs(T_new - T_old)
+    return np.sqrt(np.mean(dT**2)), np.max(dT)
+
+
+def vmr_change(conc_new, conc_old, species=key_species):
+    """RMS and maximum absolute change of log10(VMR) [dex] of the given species."""
+    species = [s for s in species if s in conc_new.header and s in conc_old.header]
+    if not species:
+        return np.nan, np.nan
+    if conc_new.data.shape[0] != conc_old.data.shape[0] or not np.allclose(conc_new.data[:, 2], conc_old.data[:, 2]):
+        conc_old = interpolate_static_conc(conc_old, conc_new.data[:, 2] * 1e-6)
+    dvmr = np.abs(log_vmr(conc_new, species) - log_vmr(conc_old, species))
+    return np.sqrt(np.mean(dvmr**2)), np.max(dvmr)
+
+
+def is_oscillating(dT_rms, patience=2, growth=1.1, min_change=1.0):
+    """
+    True if the RMS change of T(P) grew in each of the last `patience` iterations,
+    using the criterion of mark_bad_last_iters.py (growth by more than 10% and more than 1 K).
+    """
+    dT_rms = np.asarray(dT_rms, dtype=float)
+    if len(dT_rms) < patience + 1:
+        return False
+    for m in range(len(dT_rms) - patience, len(dT_rms)):
+        if not (dT_rms[m] > growth * dT_rms[m-1] and dT_rms[m] > min_change):
+            return False
+    return True
+
+
+def next_max_iter(dT_rms, dT_max, iteration, tol_T, i_full=4, near_factor=10, far_K=30):
+    """
+    HELIOS iteration budget and speed-up setting for the next coupling iteration.
+    (None, 'no') for a failed iteration (NaN changes): no decision, the driver's defaults apply.
+    """
+    if np.isnan(dT_rms) or np.isnan(dT_max):
+        return None, 'no'
+    if iteration + 1 >= i_full or dT_max <= near_factor * tol_T:
+        return max_iter_full, 'yes'
+    if dT_rms > far_K:
+        return max_iter_first, 'no'
+    return max_iter_intermediate, 'no'
+
+
+def read_history(path):
+    if not os.path.isfile(path):
+        return np.zeros((0, len(history_columns)))
+    return np.loadtxt(path, skiprows=1, ndmin=2)
+
+
+def append_history(path, row):
+    new_file = not os.path.isfile(path)
+    with open(path, 'a') as f:
+        if new_file:
+            f.write(''.join(f'{c:<16}' for c in history_columns).rstrip() + '\n')
+        f.write(''.join(f'{v:<16.6g}' for v in row).rstrip() + '\n')
+
+
+def check_iteration(run_dir, name, iteration, tol_T=0.5, tol_vmr=0.01, i_full=4, min_iterations=2, patience=2):
+    """Evaluates coupling iteration `iteration` of a run. Returns a dictionary with the decision."""
+    P_new, T_new = read_pt(os.path.join(run_dir, f'{name}_tp_coupling_{iteration}.dat'))
+    P_old, T_old = read_pt(os.path.join(run_dir, f'{name}_tp_coupling_{iteration-1}.dat'))
+    dT_rms, dT_max = profile_change(P_new, T_new, P_old, T_old)
+
+    dvmr_rms, dvmr_max = np.nan, np.nan
+    conc_new_path = os.path.join(run_dir, f'Static_Conc_{iteration}.dat')
+    conc_old_path = os.path.join(run_dir, f'Static_Conc_{iteration-1}.dat')
+    if os.path.isfile(conc_new_path) and os.path.isfile(conc_old_path):
+        dvmr_rms, dvmr_max = vmr_change(read_static_conc(conc_new_path), read_static_conc(conc_old_path))
+
+    history_path = os.path.join(run_dir, f'{name}_chelio_convergence.dat')
+    history = read_history(history_path)
+    history = history[history[:, 0] < iteration] # ignore rows of an earlier attempt (resumed runs)
+    dT_history = np.append(history[:, 1], dT_rms)
+
+    # NaN comparisons are False, so failed iterations never count as converged
+    failed = bool(np.isnan(dT_rms))
+    converged = bool(iteration + 1 >= min_iterations and dT_max < tol_T and dvmr_max < tol_vmr)
+    oscillating = is_oscillating(dT_history, patience=patience)
+    max_iter, speed_up = next_max_iter(dT_rms, dT_max, iteration, tol_T, i_full=i_full)
+
+    stop = converged or oscillating
+    append_history(history_path, [iteration, dT_rms, dT_max, dvmr_rms, dvmr_max,
+                                  np.nan if max_iter is None else max_iter, int(stop), int(oscillating)])
+    if oscillating:
+        with open(os.path.join(run_dir, f'{name}_oscillating.dat'), 'w') as f:
+            f.write(f'{iteration}\n')
+
+    return {
+        'dT_rms': dT_rms, 'dT_max': dT_max, 'dvmr_rms': dvmr_rms, 'dvmr_max': dvmr_max,
+        'converged': converged, 'oscillating': oscillating, 'failed': failed, 'stop': stop,
+        'max_iter': max_iter, 'speed_up': speed_up,
+    }
+
+
+def print_report(result, file=None):
+    print(f"Coupling change: dT rms/max = {result['dT_rms']:.3g}/{result['dT_max']:.3g} K, "
+          f"dVMR rms/max = {result['dvmr_rms']:.3g}/{result['dvmr_max']:.3g} dex", file=file)
+    if result['failed']:
+        print('Warning: no valid T(P) profile of this or the previous iteration (failed HELIOS run?), '
+              'change of T(P) unknown.', file=file)
+    if result['oscillating']:
+        print('Warning: T(P) changes have been growing, run is flagged as oscillating.', file=file)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check convergence of a HELIOS-GGchem coupling iteration.')
+    parser.add_argument('--run_dir', type=str, required=True, help='Output directory of the run')
+    parser.add_argument('--name', type=str, required=True, help='Name of the run')
+    parser.add_argument('--iteration', type=int, required=True, help='Coupling iteration HELIOS has just finished')
+    parser.add_argument('--tol_T', type=float, default=0.5, help='Tolerance for the maximum change of T(P) [K]')
+    parser.add_argument('--tol_vmr', type=float, default=0.01, help='Tolerance for the maximum change of log10(VMR) of key species [dex]')
+    parser.add_argument('--i_full', type=int, default=4, help='Iteration from which HELIOS always runs with the full iteration budget')
+    parser.add_argument('--min_iterations', type=int, default=2, help='Minimum number of coupling iterations before stopping')
+    parser.add_argument('--patience', type=int, default=2, help='Number of consecutive growing T(P) changes flagged as oscillation')
+
+    args = parser.parse_args()
+
+    result = check_iteration(args.run_dir, args.name, args.iteration, tol_T=args.tol_T, tol_vmr=args.tol_vmr,
+                             i_full=args.i_full, min_iterations=args.min_iterations, patience=args.patience)
+
+    print_report(result)
+    print(f"stop: {int(result['stop'])}, oscillating: {int(result['oscillating'])}, failed: {int(result['failed'])}, "
+          f"next HELIOS budget: {result['max_iter'] if result['max_iter'] is not None else 'default'}, "
+          f"speed-up: {result['speed_up']}")
@@ -1,99 +1,214 @@
 import numpy as np
 
+import argparse
 import time
 import sys
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 
 # import species database with args ['name', 'fc_name', 'weight']
 # for name conversion and calculation of mean molecular weight
 sys.path.append(os.path.join(os.environ['HELIOS_PATH'], 'source'))
 from species_database import species_lib
 
-print('Converting GGchem output to HELIOS input format ...')
+from ggchem_io import read_static_conc, gas_columns, sidecar_paths, write_sidecar
 
-# read in output file from second arg of command
-if len(sys.argv) > 1:
-    write_to = sys.argv[1]
-else:
-    write_to = os.path.abspath(os.path.join(os.path.dirname(__file__), '../helios_inputs/mixfile.dat'))
 
-# read relevant species from helios_inputs/species.dat
-species = np.loadtxt(os.path.abspath(os.path.join(os.path.dirname(__file__), '../helios_inputs/species.dat')), dtype=str, usecols=(0,))[1:]
+def read_species(species_file):
+    # read relevant species from helios_inputs/species.dat
+    species = np.loadtxt(species_file, dtype=str, usecols=(0,))[1:]
 
-# remove CIA (assumes that CIA species are already accounted for!)
-species = np.array([s for s in species if s[:3] != 'CIA'])
+    # remove CIA (assumes that CIA species are already accounted for!)
+    return np.array([s for s in species if s[:3] != 'CIA'])
 
 
-# read GGchem output file
-ggchem_output = os.path.join(os.environ['GGCHEM_PATH'], 'Static_Conc.dat')
-header = np.loadtxt(ggchem_output, skiprows=2, max_rows=1, dtype=str)
-dimension = np.genfromtxt(ggchem_output, dtype=int,  max_rows=1, skip_header=1)
-data = np.loadtxt(ggchem_output, skiprows=3)
+conversions = {'P(bar)': 'pgas', 'T(k)': 'Tg', 'n_<tot>(cm-3)': 'calculated_ntot', 'm(u)': 'calculated_mu', 'e-': 'el'}
 
-n_elem = dimension[0]
-n_mol = dimension[1]
-n_dust = dimension[2]
-n_layers = dimension[3]
+# column mappings per (GGchem header, species) signature, see column_map()
+_column_maps = {}
 
-conversions = {'P(bar)': 'pgas', 'T(k)': 'Tg', 'n_<tot>(cm-3)': 'calculated_ntot', 'm(u)': 'calculated_mu', 'e-': 'el'}
 
-# create header with correct (species) names
-new_header = list(conversions.keys())
-#new_header.extend([species_lib[s].fc_name for s in header[4:4+n_elem+n_mol] if s in species]) # fc = fastchem
-new_header.extend([species_lib[s].name for s in header[4:4+n_elem+n_mol] if s in species])
-new_header = np.array(new_header)
+def column_map(header, dimension, species):
+    """
+    Returns the mixfile header, the molecular weights of the GGchem gas columns
+    (0 for species unknown to HELIOS), a mask of the known columns and the
+    (GGchem gas column, mixfile column) index pairs of the saved species.
+    Computed once per header and species list.
+    """
+    key = (tuple(header), tuple(dimension[:2]), tuple(species))
+    if key in _column_maps:
+        return _column_maps[key]
 
-# convert data
-new_data = np.zeros((n_layers, len(new_header)))
+    gas = gas_columns(dimension)
+    gas_names = ['e-' if s == 'el' else s for s in header[gas]]
 
-# Pressure (convert from cgs (dyn/cm^2) to bar)
-new_data[:,0] = data[:,np.where(header == conversions[new_header[0]])[0][0]] * 1e-6
+    # create header with correct (species) names
+    new_header = list(conversions.keys())
+    #new_header.extend([species_lib[s].fc_name for s in header[4:4+n_elem+n_mol] if s in species]) # fc = fastchem
+    new_header.extend([species_lib[s].name for s in gas_names[1:] if s in species])
+    new_header = np.array(new_header)
 
-# Temperature
-new_data[:,1] = data[:,np.where(header == conversions[new_header[1]])[0][0]]
+    known = np.array([s in species_lib for s in gas_names])
+    weights = np.array([species_lib[s].weight if s in species_lib else 0.0 for s in gas_names])
 
-# Calculate total number density
-n_tot = 10**data[:,3:4+n_elem+n_mol]
-n_tot = np.sum(n_tot, axis=1)
-new_data[:,2] = n_tot
+    # first occurrence of each name in the mixfile header
+    position = {}
+    for j, name in enumerate(new_header):
+        position.setdefault(name, j)
+    src, dst = [], []
+    for i, s in enumerate(gas_names):
+        if s in species or s == 'e-':
+            src.append(i)
+            dst.append(position[species_lib[s].name])
 
-# Calculate mean molecular weight
-mu = np.zeros(n_layers)
-a_tot = np.zeros(n_layers)
+    mapping = (new_header, weights, known, np.array(src, dtype=int), np.array(dst, dtype=int))
+    _column_maps[key] = mapping
+    return mapping
 
-for i,s in enumerate(header[3:4+n_elem+n_mol]):
-    if s in species_lib.keys():
-        a_mol = 10**data[:,3+i] # number density
-        a_mol = a_mol / n_tot # fraction
-        mu += a_mol * species_lib[s].weight
-        a_tot += a_mol
 
-    elif s == 'el':
-        s = 'e-'
-        a_mol = 10**data[:,3] # number density
-        a_mol = a_mol / n_tot # fraction
-        mu += a_mol * species_lib[s].weight
-        a_tot += a_mol
+def mixfile_data(conc, species):
+    """Converts GGchem output (ggchem_io.StaticConc) to the mixfile header and data for the given species."""
+    new_header, weights, known, src, dst = column_map(conc.header, conc.dimension, species)
+    data = conc.data
+    n_layers = data.shape[0]
 
-    # save species fractions
-    if s in species or s == 'e-':
-        #new_data[:,np.where(new_header == species_lib[s].fc_name)[0][0]] = a_mol
-        new_data[:,np.where(new_header == species_lib[s].name)[0][0]] = a_mol
+    new_data = np.zeros((n_layers, len(new_header)))
 
-if np.any(a_tot < 0.99):
-    print("Warning: sum of considered species fractions is less than 1 in some layers!")
-    time.sleep(0.5)
+    # Pressure (convert from cgs (dyn/cm^2) to bar)
+    new_data[:,0] = data[:,np.where(conc.header == conversions['P(bar)'])[0][0]] * 1e-6
 
-new_data[:,3] = mu
+    # Temperature
+    new_data[:,1] = data[:,np.where(conc.header == conversions['T(k)'])[0][0]]
 
-# nicely format header
-header_string = []
-for i in range(len(new_header)):
-    header_string.append(new_header[i])
-    n_spaces = 16 - len(new_header[i])
-    header_string.append(n_spaces*' '+'\t')
-header_string = ''.join(header_string[:-1])
+    # Number densities (exponentiated once), total number density and species fractions
+    fractions = 10**data[:,gas_columns(conc.dimension)]
+    n_tot = np.sum(fractions, axis=1)
+    fractions /= n_tot[:,np.newaxis]
+    new_data[:,2] = n_tot
 
-# save to file
-np.savetxt(write_to, new_data, header=header_string, fmt='%.10e', comments='', delimiter='\t')
+    # Mean molecular weight
+    new_data[:,3] = fractions @ weights
+    a_tot = fractions @ known
 
+    # save species fractions
+    new_data[:,dst] = fractions[:,src]
+
+    if np.any(a_tot < 0.99):
+        print("Warning: sum of considered species fractions is less than 1 in some layers!")
+        time.sleep(0.5)
+
+    return new_header, new_data
+
+
+def write_mixfile(write_to, new_header, new_data):
+    # nicely format header
+    header_string = []
+    for i in range(len(new_header)):
+        header_string.append(new_header[i])
+        n_spaces = 16 - len(new_header[i])
+        header_string.append(n_spaces*' '+'\t')
+    header_string = ''.join(header_string[:-1])
+
+    # save to file
+    np.savetxt(write_to, new_data, header=header_string, fmt='%.10e', comments='', delimiter='\t')
+
+
+def convert_mixfile(ggchem_output, write_to, species):
+    """Converts a GGchem output file to a HELIOS mixfile with the given species."""
+    new_header, new_data = mixfile_data(read_static_conc(ggchem_output), species)
+    write_mixfile(write_to, new_header, new_data)
+
+
+def find_static_conc(out_dir, mixfile='vertical_mix'):
+    """
+    (Static_Conc_{i}[_bad].dat, {mixfile}_{i}.dat) path pairs of all runs below out_dir.
+    mark_bad_last_iters.py renames only the Static_Conc file of a bad iteration, so the
+    mixfile of Static_Conc_{i}_bad.dat is the existing {mixfile}_{i}.dat (unless there
+    is also a Static_Conc_{i}.dat).
+    """
+    pattern = re.compile(r'^Static_Conc_(-?\d+)(_bad)?\.dat$')
+    pairs = []
+    for root, _, files in os.walk(out_dir):
+        names = set(files)
+        for f in sorted(files):
+            match = pattern.match(f)
+            if match:
+                i, bad = match.groups()
+                if bad and f'Static_Conc_{i}.dat' in names:
+                    continue
+                pairs.append((os.path.join(root, f), os.path.join(root, f'{mixfile}_{i}.dat')))
+    return sorted(pairs)
+
+
+def is_up_to_date(conc_path, mix_path, species_file=None):
+    # output newer than the GGchem output (and the species file, if given)
+    if not os.path.isfile(mix_path):
+        return False
+    t_out = os.path.getmtime(mix_path)
+    if species_file is not None and os.path.getmtime(species_file) > t_out:
+        return False
+    return os.path.getmtime(conc_path) < t_out
+
+
+def _convert_pair(pair, species):
+    conc_path, mix_path = pair
+    new_header, new_data = mixfile_data(read_static_conc(conc_path), species)
+    write_mixfile(mix_path, new_header, new_data)
+    if os.path.isfile(sidecar_paths(mix_path)[0]): # refresh the binary copy
+        write_sidecar(mix_path, 1)
+    return new_data.shape[0]
+
+
+def convert_tree(out_dir, species_file, workers=1, force=False, mixfile='vertical_mix'):
+    """
+    Regenerates the mixfiles of all archived GGchem outputs below out_dir on a pool of
+    `workers` processes. Mixfiles newer than their Static_Conc file and the species file
+    are skipped unless `force` is set. Returns the number of converted files.
+    """
+    species = read_species(species_file)
+    pairs = find_static_conc(out_dir, mixfile)
+    todo = [pair for pair in pairs if force or not is_up_to_date(*pair, species_file)]
+    print(f'Found {len(pairs)} GGchem output files in {out_dir}, {len(pairs) - len(todo)} up to date.')
+
+    start = time.time()
+    if workers > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            n_layers = list(executor.map(_convert_pair, todo, [species]*len(todo), chunksize=max(1, len(todo) // (4*workers))))
+    else:
+        n_layers = [_convert_pair(pair, species) for pair in todo]
+    wall_time = time.time() - start
+
+    rate = len(todo) / wall_time if wall_time > 0 else np.inf
+    layer_rate = sum(n_layers) / wall_time if wall_time > 0 else np.inf
+    print(f'Converted {len(todo)} files ({sum(n_layers)} layers) in {wall_time:.2f} s '
+          f'with {workers} worker(s): {rate:.1f} files/s, {layer_rate:.0f} layers/s')
+    return len(todo)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert GGchem output to HELIOS mixfile.')
+    parser.add_argument('write_to', nargs='?', default=os.path.abspath(os.path.join(os.path.dirname(__file__), '../helios_inputs/mixfile.dat')), help='Output mixfile')
+    parser.add_argument('--input', type=str, default=None, help='GGchem output file (default: $GGCHEM_PATH/Static_Conc.dat)')
+    parser.add_argument('--species', type=str, default=os.path.abspath(os.path.join(os.path.dirname(__file__), '../helios_inputs/species.dat')), help='HELIOS species file')
+    parser.add_argument('--batch', type=str, default=None, help='Instead, regenerate the mixfiles vertical_mix_{i}.dat of all Static_Conc_{i}.dat files below this output directory '
+                        '(for iterations marked as bad, from Static_Conc_{i}_bad.dat)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of parallel processes in batch mode')
+    parser.add_argument('--force', action='store_true', help='Batch mode: also convert files whose mixfile is up to date')
+
+    args = parser.parse_args()
+
+    if args.batch is not None:
+        print(f'Converting GGchem output in {args.batch} to HELIOS input format ...')
+        convert_tree(args.batch, args.species, workers=args.workers, force=args.force)
+        sys.exit(0)
+
+    print('Converting GGchem output to HELIOS input format ...')
+
+    # read GGchem output file
+    if args.input is not None:
+        ggchem_output = args.input
+    else:
+        ggchem_output = os.path.join(os.environ['GGCHEM_PATH'], 'Static_Conc.dat')
+
+    convert_mixfile(ggchem_output, args.write_to, read_species(args.species))
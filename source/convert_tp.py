@@ -1,37 +1,42 @@
 import numpy as np
-import sys
+import argparse
 import os
 
-# read in input file from second arg of command
-if len(sys.argv) == 2:
-    read_tp = sys.argv[1]
-    Tmin = 20
-elif len(sys.argv) == 3:
-    read_tp = sys.argv[1]
-    Tmin = float(sys.argv[2])
-else:
-    print('No input file provided. Exiting ...')
-    sys.exit(1)
 
-#out_file = os.path.join(os.environ['GGCHEM_PATH'], 'structures/pt_helios.in')
-out_file = os.path.join(os.environ['GGCHEM_PATH'], 'structures/pt_helios.in')
+def convert_tp(read_tp, out_file, Tmin=20):
+    """Writes a HELIOS T(P) profile as GGchem structure file, with T >= Tmin unless HELIOS failed."""
+    # read and edit file line by line
+    with open(read_tp, 'r') as f:
+        lines = f.readlines()
+        if float(lines[1].split()[1]) == 1.001:
+            convergence = False
+        else:
+            convergence = True
+        with open(out_file, 'w') as out:
+            for i, line in enumerate(lines):
+                if i==0:
+                    out.writelines(line)
+                else:
+                    pt = np.array(line.split(), dtype=float)
+                    if convergence:
+                        pt[1] = np.maximum(pt[1], Tmin)
+                    out.writelines(
+                        "{:<24g}".format(pt[0])
+                        + "{:<18g}\n".format(pt[1])
+                    )
 
-# read and edit file line by line
-with open(read_tp, 'r') as f:
-    lines = f.readlines()
-    if float(lines[1].split()[1]) == 1.001:
-        convergence = False
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert HELIOS T(P) profile to GGchem structure file.')
+    parser.add_argument('read_tp', help='HELIOS T(P) file (e.g. {NAME}_tp_coupling_{i}.dat)')
+    parser.add_argument('Tmin', nargs='?', type=float, default=20, help='Minimum temperature [K]')
+    parser.add_argument('--out', type=str, default=None, help='Output structure file (default: $GGCHEM_PATH/structures/pt_helios.in)')
+
+    args = parser.parse_args()
+
+    if args.out is not None:
+        out_file = args.out
     else:
-        convergence = True
-    with open(out_file, 'w') as out:
-        for i, line in enumerate(lines):
-            if i==0:
-                out.writelines(line)
-            else:
-                pt = np.array(line.split(), dtype=float)
-                if convergence:
-                    pt[1] = np.maximum(pt[1], Tmin)
-                out.writelines(
-                    "{:<24g}".format(pt[0])
-                    + "{:<18g}\n".format(pt[1])
-                )
\ No newline at end of file
+        out_file = os.path.join(os.environ['GGCHEM_PATH'], 'structures/pt_helios.in')
+
+    convert_tp(args.read_tp, out_file, args.Tmin)
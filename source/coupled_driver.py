@@ -0,0 +1,371 @@
+import numpy as np
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from calc_abundances import calc_abundances, write_abundances
+from create_pt import pressure_grid, read_pt, interpolate_profile, write_pt
+from convert_mixfile import read_species, convert_mixfile
+from warm_start import seed_run
+from convergence import check_iteration, print_report
+from accelerate_tp import accelerate_step
+from run_ggchem import chemistry_step, print_summary
+from ggchem_io import write_run_sidecars
+from grid_summary import append_summary, SUMMARY_FILE
+
+# Driver of a single coupled radiative transfer (HELIOS) and equilibrium
+# chemistry (GGchem) simulation. It iterates between the two codes until
+# convergence is met or the maximum number of coupling iterations is reached.
+#
+# All Chelio steps (abundances, P-T profiles, mixfile conversion, convergence
+# checks, T(P) handoff) run inside this process; only GGchem and HELIOS are
+# started as external programs. run_coupled.bash is a thin wrapper around it,
+# and run_grid.py calls run_coupled() for many runs from long-lived workers.
+#
+# Usage:
+#   python3 source/coupled_driver.py [OPTIONS]   (options as for run_coupled.bash)
+#
+#   from coupled_driver import parse_options, run_coupled
+#   run_coupled(parse_options(['--NAME', 'test', '--TEMP', '150']))
+
+CHELIO_PATH = os.environ.get('CHELIO_PATH', os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+MIXFILE = 'vertical_mix' # Base name for mixing ratio files
+
+
+def parse_options(argv=None):
+    """Options of run_coupled.bash (see there for a description)."""
+    parser = argparse.ArgumentParser(description='Run a coupled HELIOS-GGchem simulation.')
+    # atmosphere parameters (passed on as given)
+    parser.add_argument('--TOA_P', type=str, default='1e-1', help='Top of Atmosphere Pressure [1e-6 bar]')
+    parser.add_argument('--BOA_P', type=str, default='1e6', help='Bottom of Atmosphere Pressure [1e-6 bar]')
+    parser.add_argument('--TEMP', type=str, default='200', help='Internal Temperature [K]')
+    parser.add_argument('--ALBEDO', type=str, default='0.1', help='Surface Albedo')
+    parser.add_argument('--CplusO', type=str, default='1e-3', help='C+O abundance')
+    parser.add_argument('--CtoO', type=str, default='0.59', help='C/O ratio')
+    parser.add_argument('--a_N', type=str, default='0.0', help='Nitrogen abundance')
+    parser.add_argument('--i_min', type=int, default=0, help='Starting coupling iteration index')
+    # output
+    parser.add_argument('--OUT_DIR', type=str, default='output', help='Output directory (absolute or relative to CHELIO_PATH)')
+    parser.add_argument('--NAME', type=str, default='test', help='Name of the simulation')
+    parser.add_argument('--WORK_DIR', type=str, default='', help='Private scratch directory (default: temporary directory)')
+    parser.add_argument('--WARM_START', type=str, default='', help='Directory with converged runs to seed from')
+    parser.add_argument('--SEED_MIXFILE', choices=['yes', 'no'], default='no', help='Also seed the initial chemistry')
+    # coupling control
+    parser.add_argument('--i_max', type=int, default=10, help='Maximum coupling iteration index')
+    parser.add_argument('--i_full', type=int, default=4, help='Iteration from which HELIOS runs with the full budget and speed-up')
+    parser.add_argument('--EARLY_STOP', choices=['yes', 'no'], default='no', help='Let the Chelio convergence monitor stop the coupling')
+    parser.add_argument('--TOL_T', type=float, default=0.5, help='Tolerance for the max. change of T(P) [K]')
+    parser.add_argument('--TOL_VMR', type=float, default=0.01, help='Tolerance for the max. change of log10(VMR) [dex]')
+    parser.add_argument('--ACCEL', choices=['none', 'relax', 'aitken', 'anderson'], default='none', help='Acceleration of the T(P) handoff')
+    parser.add_argument('--ACCEL_ALPHA', type=float, default=0.5, help='Relaxation/mixing parameter')
+    parser.add_argument('--ACCEL_DEPTH', type=int, default=3, help='History length for Anderson mixing')
+    parser.add_argument('--N_COARSE', type=int, default=0, help='Number of coupling iterations on a coarse layer grid')
+    parser.add_argument('--COARSE_FACTOR', type=float, default=3, help='Factor fewer layers per pressure decade on the coarse grid')
+    # chemistry step
+    parser.add_argument('--GGCHEM_SHARDS', type=int, default=1, help='Number of concurrent GGchem processes per step')
+    parser.add_argument('--GGCHEM_DT', type=float, default=0, help='Temperature change [K] below which layers are not solved again')
+    parser.add_argument('--GGCHEM_CACHE', type=str, default='', help='Directory of the GGchem output cache')
+    parser.add_argument('--GGCHEM_CACHE_SIZE', type=float, default=1000, help='Maximum size of the cache [MB]')
+    return parser.parse_args(argv)
+
+
+def chelio_path(path):
+    # absolute, or relative to CHELIO_PATH
+    return os.path.join(CHELIO_PATH, path)
+
+
+def prepare_work_dir(work_dir):
+    # Layout (mirrors the GGchem installation):
+    #   WORK_DIR/abund_helios.in           GGchem abundances
+    #   WORK_DIR/input/param_helios.in     GGchem parameter file
+    #   WORK_DIR/structures/pt_helios.in   GGchem P-T structure
+    #   WORK_DIR/data -> GGCHEM_PATH/data  GGchem thermochemical data (read-only)
+    #   WORK_DIR/Static_Conc.dat           GGchem output
+    #   WORK_DIR/param.dat                 HELIOS parameter file
+    os.makedirs(os.path.join(work_dir, 'input'), exist_ok=True)
+    os.makedirs(os.path.join(work_dir, 'structures'), exist_ok=True)
+    data_link = os.path.join(work_dir, 'data')
+    if os.path.islink(data_link):
+        os.remove(data_link)
+    os.symlink(os.path.join(os.environ['GGCHEM_PATH'], 'data'), data_link)
+    if os.path.isfile(os.path.join(work_dir, 'Static_Conc.dat')):
+        os.remove(os.path.join(work_dir, 'Static_Conc.dat'))
+
+
+def run_helios(opts, run_dir, work_dir, i, max_iter, speed_up, started_convection, n_layers=None):
+    command = ['python3', '-u', 'helios.py',
+               '-parameter_file', os.path.join(work_dir, 'param.dat'),
+               '-name', opts.NAME,
+               '-output_directory', os.path.join(os.path.dirname(run_dir), ''),
+               '-toa_pressure', opts.TOA_P,
+               '-boa_pressure', opts.BOA_P,
+               '-internal_temperature', opts.TEMP,
+               '-surface_albedo', opts.ALBEDO,
+               '-path_to_temperature_file', os.path.join(run_dir, f'{opts.NAME}_tp_coupling_{i-1}.dat'),
+               '-opacity_mixing', 'on-the-fly',
+               '-path_to_species_file', chelio_path('helios_inputs/species.dat'),
+               '-file_with_vertical_mixing_ratios', os.path.join(run_dir, f'{MIXFILE}_{i}.dat'),
+               '-coupling_mode', 'yes',
+               '-coupling_iteration_step', str(i),
+               '-coupling_speed_up', speed_up,
+               '-started_convection', str(started_convection),
+               '-write_tp_profile_during_run', str(max_iter),
+               '-maximum_number_of_iterations', str(max_iter+1)]
+    if n_layers is not None:
+        command += ['-number_of_layers', str(n_layers)]
+    sys.stdout.flush()
+    subprocess.run(command, cwd=os.environ['HELIOS_PATH'], stdout=sys.stdout, stderr=sys.stderr, check=True)
+
+
+def read_flag(path):
+    with open(path, 'r') as f:
+        return int(float(f.read().strip()))
+
+
+def run_coupled(opts):
+    """Runs one coupled simulation. Returns False if it was skipped because output exists."""
+    name = opts.NAME
+    out_root = chelio_path(opts.OUT_DIR)
+    run_dir = os.path.join(out_root, name)
+    os.makedirs(run_dir, exist_ok=True)
+
+    # Check if the initial output file already exists to prevent overwriting
+    # This check only considers the very first expected output file.
+    first_mixfile = os.path.join(run_dir, f'{MIXFILE}_{opts.i_min+1}.dat')
+    if os.path.isfile(first_mixfile):
+        print(f'Warning: Output file {first_mixfile} already exists.')
+        print('         Skipping this simulation to prevent overwriting.')
+        print(f'         To force re-run, delete the existing output directory: {run_dir}')
+        return False
+
+    print(f'--- Starting Chelio Simulation: {name} ---')
+    print(f'Output directory: {out_root}')
+
+    # Record the run parameters (used e.g. to find neighbouring runs for warm starts)
+    with open(os.path.join(run_dir, 'run_params.dat'), 'w') as f:
+        for key in ['TOA_P', 'BOA_P', 'TEMP', 'ALBEDO', 'CplusO', 'CtoO', 'a_N']:
+            f.write(f'{key} {getattr(opts, key)}\n')
+
+    # All files GGchem and HELIOS read or write during the run live in a private
+    # working directory, so that several simulations can run side by side
+    work_dir = opts.WORK_DIR
+    temporary = not work_dir
+    if temporary:
+        work_dir = tempfile.mkdtemp(prefix=f'chelio_{name}.', dir=os.environ.get('TMPDIR', '/tmp'))
+    try:
+        prepare_work_dir(work_dir)
+        print(f'Working directory: {work_dir}')
+        coupling_loop(opts, run_dir, work_dir)
+    finally:
+        if temporary:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return True
+
+
+def coupling_loop(opts, run_dir, work_dir):
+    name = opts.NAME
+    pt_path = os.path.join(work_dir, 'structures', 'pt_helios.in')
+    conc_path = os.path.join(work_dir, 'Static_Conc.dat')
+    stats_file = os.path.join(run_dir, f'{name}_ggchem_steps.dat')
+    species = read_species(chelio_path('helios_inputs/species.dat'))
+
+    # GGchem step (see run_ggchem.py); after a seeded start all layers are solved once
+    cache_dir = chelio_path(opts.GGCHEM_CACHE) if opts.GGCHEM_CACHE else None
+    ggchem_full_next = False
+
+    def run_ggchem(step):
+        nonlocal ggchem_full_next
+        dT = 0 if ggchem_full_next else opts.GGCHEM_DT
+        ggchem_full_next = False
+        chemistry_step(work_dir, shards=opts.GGCHEM_SHARDS, dT_threshold=dT, cache_dir=cache_dir,
+                       cache_size=opts.GGCHEM_CACHE_SIZE, stats_file=stats_file, step=step)
+
+    # Coarse-to-fine coupling: the first N_COARSE iterations use a layer grid
+    # with COARSE_FACTOR fewer layers per pressure decade
+    coarse = opts.N_COARSE > 0
+    grid_factor = opts.COARSE_FACTOR if coarse else 1
+    coarse_until = min(opts.i_min + opts.N_COARSE, opts.i_max)
+    if coarse:
+        print(f'Running coupling iterations {opts.i_min} to {coarse_until-1} on a coarse layer grid (factor {opts.COARSE_FACTOR}).')
+
+    # --- Initial GGchem setup and run ---
+    print('Initializing GGchem with initial abundances and P-T profile...')
+    write_abundances(os.path.join(work_dir, 'abund_helios.in'),
+                     calc_abundances(float(opts.CplusO), float(opts.CtoO), float(opts.a_N)))
+
+    # Initial P-T-profile for GGchem, either from the closest converged run or
+    # isothermal (starting with higher T (e.g., 500K) can help prevent all
+    # species condensing initially)
+    warm_started = False
+    if opts.WARM_START:
+        params = {key: float(getattr(opts, key)) for key in ['BOA_P', 'TEMP', 'CplusO', 'CtoO']}
+        warm_started = seed_run(chelio_path(opts.WARM_START), params, float(opts.TOA_P), float(opts.BOA_P), pt_path,
+                                out_conc=conc_path if opts.SEED_MIXFILE == 'yes' else None,
+                                exclude=name, coarse_factor=grid_factor)
+    if not warm_started:
+        P = pressure_grid(float(opts.TOA_P) * 1e-6, float(opts.BOA_P) * 1e-6, grid_factor)
+        write_pt(pt_path, P, 500 * np.ones_like(P))
+
+    shutil.copy(chelio_path('ggchem_inputs/param.in'), os.path.join(work_dir, 'input', 'param_helios.in'))
+
+    # Copy initial input files to the output directory for archiving
+    shutil.copy(os.path.join(work_dir, 'abund_helios.in'), os.path.join(run_dir, 'abundances.in'))
+    shutil.copy(pt_path, os.path.join(run_dir, f'{name}_tp_coupling_-1.dat'))
+    shutil.copy(chelio_path('ggchem_inputs/param.in'), os.path.join(run_dir, 'param_ggchem.in'))
+
+    # Run GGchem for the first time (unless the chemistry was seeded by the warm start)
+    if os.path.isfile(conc_path):
+        print('Using seeded GGchem output, skipping initial GGchem calculation.')
+        ggchem_full_next = True # interpolated chemistry must not be reused
+    else:
+        print('Running initial GGchem calculation...')
+        run_ggchem(-1)
+
+    # --- HELIOS-GGchem coupling loop ---
+
+    # Private copy of the HELIOS parameter file (param.dat might be modified by HELIOS)
+    shutil.copy(chelio_path('helios_inputs/param.dat'), os.path.join(work_dir, 'param.dat'))
+
+    started_convection = 0
+    coupling_speed_up = 'no'
+    next_max_iter = None # HELIOS budget chosen by the convergence monitor (None: use defaults)
+    next_speed_up = 'no'
+    n_layers = len(read_pt(pt_path)[0]) if coarse else None # HELIOS layer count on the coarse grid
+
+    print(f'Starting HELIOS-GGchem coupling iterations (max {opts.i_max} iterations)...')
+
+    # marker of a run stopped by the convergence monitor (see below), not valid for a new attempt
+    chelio_converged_file = os.path.join(run_dir, f'{name}_chelio_converged.dat')
+    if os.path.isfile(chelio_converged_file):
+        os.remove(chelio_converged_file)
+
+    i = opts.i_min
+    for i in range(opts.i_min, opts.i_max + 1):
+        print(f'--- Coupling Iteration: {i} ---')
+        mixfile = os.path.join(run_dir, f'{MIXFILE}_{i}.dat')
+
+        # Convert GGchem output to HELIOS mixfile format
+        # This is done if we are starting a new run (i=0) or resuming (i > i_min)
+        if i > opts.i_min or i == 0:
+            print('Converting GGchem output to HELIOS mixfile...')
+            convert_mixfile(conc_path, mixfile, species)
+            shutil.copy(conc_path, os.path.join(run_dir, f'Static_Conc_{i}.dat'))
+            write_run_sidecars(run_dir, i, MIXFILE)
+
+        if not os.path.isfile(mixfile):
+            raise FileNotFoundError(f'Vertical mixing ratios file for iteration {i} not found: {mixfile}')
+
+        # HELIOS max iterations based on coupling iteration number,
+        # or on how close the run is to convergence (see convergence.py)
+        max_iter = 10000 # Default for intermediate iterations
+        if i == 0:
+            max_iter = 1000 # Relaxed for first iteration
+        elif next_max_iter is not None:
+            max_iter = next_max_iter
+            if next_speed_up == 'yes':
+                coupling_speed_up = 'yes'
+        elif i >= opts.i_full:
+            max_iter = 30000 # Tightest convergence for later iterations
+            coupling_speed_up = 'yes' # Enable HELIOS speed-up (average of last 2 iterations)
+
+        # Previous convection status from HELIOS
+        convection_file = os.path.join(run_dir, f'{name}_started_convection.dat')
+        if i > 0 and os.path.isfile(convection_file):
+            started_convection = read_flag(convection_file)
+            print(f'Previous convection status: {started_convection}')
+
+        print(f'Running HELIOS for iteration {i}...')
+        run_helios(opts, run_dir, work_dir, i, max_iter, coupling_speed_up, started_convection, n_layers)
+
+        # Chelio convergence monitor: changes of T(P) and key VMRs w.r.t. the previous
+        # iteration are logged to {NAME}_chelio_convergence.dat
+        conv_stop, conv_oscillating = False, False
+        try:
+            result = check_iteration(run_dir, name, i, tol_T=opts.TOL_T, tol_vmr=opts.TOL_VMR, i_full=opts.i_full)
+            print_report(result)
+            if opts.EARLY_STOP == 'yes':
+                conv_stop, conv_oscillating = result['stop'], result['oscillating']
+                next_max_iter, next_speed_up = result['max_iter'], result['speed_up']
+        except Exception as e:
+            print(f'Warning: convergence monitor failed for iteration {i}: {e}')
+
+        # Coupling convergence from HELIOS
+        # (on the coarse grid, convergence only ends the coarse phase)
+        convergence_file = os.path.join(run_dir, f'{name}_coupling_convergence.dat')
+        if i > 0 and os.path.isfile(convergence_file):
+            stop = read_flag(convergence_file)
+            print(f'--> Coupling converged? {stop} (1 = yes, 0 = no)')
+            if stop == 1 and not coarse:
+                print('Coupling converged. Stopping iterations.')
+                break
+            elif stop == 1:
+                conv_stop = True
+
+        switch_to_fine = False
+        if conv_oscillating:
+            print(f'Warning: T(P) changes keep growing (see {name}_oscillating.dat). Stopping iterations.')
+            break
+        elif coarse:
+            if conv_stop or i + 1 >= coarse_until:
+                print(f'Coarse-grid phase finished after iteration {i}, switching to the full layer grid.')
+                switch_to_fine = True
+        elif conv_stop:
+            print(f'Coupling converged within TOL_T={opts.TOL_T} K and TOL_VMR={opts.TOL_VMR} dex. Stopping iterations.')
+            # counterpart of {NAME}_coupling_convergence.dat written by HELIOS (used by warm_start.py)
+            with open(chelio_converged_file, 'w') as f:
+                f.write('1\n')
+            break
+
+        # Next GGchem input: the new T(P) profile from HELIOS, or mixed with the
+        # previous iterations (archived as {NAME}_tp_ggchem_{i}.dat)
+        print('Preparing GGchem for next iteration with new T(P) profile...')
+        if opts.ACCEL == 'none':
+            shutil.copy(os.path.join(run_dir, f'{name}_tp_coupling_{i}.dat'), pt_path)
+        else:
+            accelerate_step(run_dir, name, i, pt_path, method=opts.ACCEL, alpha=opts.ACCEL_ALPHA, depth=opts.ACCEL_DEPTH)
+
+        # End of the coarse phase: interpolate the profile onto the full layer grid
+        # (HELIOS interpolates its start profile {NAME}_tp_coupling_{i}.dat itself)
+        if switch_to_fine:
+            P = pressure_grid(float(opts.TOA_P) * 1e-6, float(opts.BOA_P) * 1e-6)
+            write_pt(pt_path, P, interpolate_profile(*read_pt(pt_path), P))
+            coarse = False
+            n_layers = None
+
+        print(f'Running GGchem for iteration {i}...')
+        run_ggchem(i)
+
+    # --- Final steps ---
+
+    # Convert the final GGchem output and save it for analysis
+    print('Performing final conversion of GGchem output...')
+    convert_mixfile(conc_path, os.path.join(run_dir, f'{MIXFILE}_{i+1}.dat'), species)
+    shutil.copy(conc_path, os.path.join(run_dir, f'Static_Conc_{i+1}.dat'))
+    write_run_sidecars(run_dir, i+1, MIXFILE)
+
+    print_summary(stats_file)
+
+    # Add the run to the summary table of the output directory
+    try:
+        append_summary(run_dir)
+    except Exception as e:
+        print(f'Warning: could not add the run to {SUMMARY_FILE}: {e}')
+    print(f'Simulation {name} completed.')
+
+
+def main(argv=None):
+    opts = parse_options(argv)
+    for variable in ['GGCHEM_PATH', 'HELIOS_PATH']:
+        if not os.environ.get(variable):
+            print(f'Error: {variable} environment variable is not set.')
+            sys.exit(1)
+    run_coupled(opts)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,27 +2,54 @@ import numpy as np
 import argparse
 import os
 
-print('Creating initial P-T-profile...')
 
-parser = argparse.ArgumentParser(description='Create initial P-T-profile.')
-parser.add_argument('--Teq', type=float, default=200, help='Equilibrium Temperature')
-parser.add_argument('--Pmin', type=float, default=1e0, help='Minimum Pressure [1e-6 bar]')
-parser.add_argument('--Pmax', type=float, default=1e6, help='Maximum Pressure [1e-6 bar]')
+def pressure_grid(Pmin, Pmax, coarse_factor=1):
+    # Pmin, Pmax in bar; layers from bottom (Pmax) to top (Pmin)
+    # coarse_factor > 1 gives a correspondingly coarser grid (coarse-to-fine coupling)
+    nlayer = np.int32(np.ceil(10.5 * np.log10(Pmax / Pmin) / coarse_factor) + 1)
+    return np.logspace(np.log10(Pmax), np.log10(Pmin), nlayer)
 
-args = parser.parse_args()
 
-Teq = args.Teq
-Pmin = args.Pmin * 1e-6
-Pmax = args.Pmax * 1e-6
+def read_pt(filename):
+    # P [bar], T [K] with one header line (create_pt.py and HELIOS *_tp_coupling_*.dat files)
+    pt = np.loadtxt(filename, skiprows=1, ndmin=2)
+    return pt[:,0], pt[:,1]
 
-nlayer = np.int32(np.ceil(10.5 * np.log10(Pmax / Pmin)) + 1)
 
-P = np.logspace(np.log10(Pmax), np.log10(Pmin), nlayer)
-T = np.ones_like(P) * Teq
+def interpolate_profile(P_old, T_old, P_new):
+    # linear in log(P); constant T beyond the ends of the old profile
+    order = np.argsort(P_old)
+    return np.interp(np.log10(P_new), np.log10(P_old[order]), T_old[order])
 
-filename = os.path.abspath(os.path.join(os.path.dirname(__file__), '../ggchem_inputs/pt_helios.in'))
 
-with open(filename, 'w') as f:
-    f.write(f'# P [bar], T [K]\n')
-    for i in range(nlayer):
-        f.write(f'{P[i]:.6e} {T[i]:.6e}\n')
\ No newline at end of file
+def write_pt(filename, P, T):
+    with open(filename, 'w') as f:
+        f.write(f'# P [bar], T [K]\n')
+        for i in range(len(P)):
+            f.write(f'{P[i]:.6e} {T[i]:.6e}\n')
+
+
+if __name__ == '__main__':
+    print('Creating initial P-T-profile...')
+
+    parser = argparse.ArgumentParser(description='Create initial P-T-profile.')
+    parser.add_argument('--Teq', type=float, default=200, help='Equilibrium Temperature')
+    parser.add_argument('--Pmin', type=float, default=1e0, help='Minimum Pressure [1e-6 bar]')
+    parser.add_argument('--Pmax', type=float, default=1e6, help='Maximum Pressure [1e-6 bar]')
+    parser.add_argument('--coarse_factor', type=float, default=1, help='Use a grid with this factor fewer layers per pressure decade')
+    parser.add_argument('--from_profile', type=str, default=None, help='Interpolate this P-T file onto the new grid instead of using an isothermal profile')
+    parser.add_argument('--out', type=str, default=os.path.abspath(os.path.join(os.path.dirname(__file__), '../ggchem_inputs/pt_helios.in')), help='Output P-T file')
+
+    args = parser.parse_args()
+
+    Teq = args.Teq
+    Pmin = args.Pmin * 1e-6
+    Pmax = args.Pmax * 1e-6
+
+    P = pressure_grid(Pmin, Pmax, args.coarse_factor)
+    if args.from_profile is not None:
+        T = interpolate_profile(*read_pt(args.from_profile), P)
+    else:
+        T = np.ones_like(P) * Teq
+
+    write_pt(args.out, P, T)
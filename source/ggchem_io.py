@@ -0,0 +1,153 @@
+import numpy as np
+from collections import namedtuple
+import os
+
+# Reading and writing of GGchem output files (Static_Conc.dat).
+#
+# File layout:
+#   line 1: free-form line (element abundances)
+#   line 2: n_elem n_mol n_dust n_layers
+#   line 3: column names: Tg nHtot pgas el <elements> <molecules> S<dust> n<dust> eps<elements> dust/gas ...
+#   line 4+: one row per layer
+# Gas-phase densities are given as log10(n [cm^-3]), pgas in dyn/cm^2.
+#
+# Archived outputs of a run (Static_Conc_{i}.dat, vertical_mix_{i}.dat) can have a
+# binary sidecar next to them, which is read instead of parsing the text file:
+#   <name>.npy: data block stored column by column, shape (n_columns, n_layers)
+#   <name>.hdr: the text header lines of <name>.dat (for Static_Conc: first line,
+#               n_elem n_mol n_dust n_layers, column names)
+# A sidecar older than its text file, or without its text file, is ignored.
+
+StaticConc = namedtuple('StaticConc', ['first_line', 'dimension', 'header', 'data'])
+
+
+def sidecar_paths(path):
+    base = os.path.splitext(path)[0]
+    return base + '.npy', base + '.hdr'
+
+
+def sidecar_is_fresh(path):
+    # sidecar complete and not older than its text file (a leftover of a deleted output is not used)
+    npy_path, hdr_path = sidecar_paths(path)
+    if not (os.path.isfile(path) and os.path.isfile(npy_path) and os.path.isfile(hdr_path)):
+        return False
+    return os.path.getmtime(path) <= os.path.getmtime(npy_path)
+
+
+def read_sidecar(path, mmap=True):
+    """
+    Header lines and data block (n_layers, n_columns) of the sidecar of the text
+    file `path`, memory-mapped by default. None if there is no up-to-date sidecar.
+    """
+    if not sidecar_is_fresh(path):
+        return None
+    npy_path, hdr_path = sidecar_paths(path)
+    with open(hdr_path, 'r') as f:
+        header_lines = f.readlines()
+    return header_lines, np.load(npy_path, mmap_mode='r' if mmap else None).T
+
+
+def write_sidecar(path, n_header):
+    """Writes the binary sidecar of the text file `path` with `n_header` header lines."""
+    with open(path, 'r') as f:
+        header_lines = [f.readline() for _ in range(n_header)]
+    data = np.loadtxt(path, skiprows=n_header, ndmin=2)
+    if data.size == 0: # e.g. failed GGchem run, keep the text file as the only source
+        return
+    npy_path, hdr_path = sidecar_paths(path)
+    with open(hdr_path, 'w') as f:
+        f.writelines(header_lines)
+    np.save(npy_path, np.ascontiguousarray(data.T))
+
+
+def write_run_sidecars(run_dir, iteration, mixfile='vertical_mix'):
+    # sidecars of the archived GGchem output and mixfile of a coupling iteration
+    for name, n_header in [(f'Static_Conc_{iteration}.dat', 3), (f'{mixfile}_{iteration}.dat', 1)]:
+        path = os.path.join(run_dir, name)
+        if os.path.isfile(path):
+            write_sidecar(path, n_header)
+
+
+def rename_with_sidecar(src, dst):
+    os.rename(src, dst)
+    for src_sidecar, dst_sidecar in zip(sidecar_paths(src), sidecar_paths(dst)):
+        if os.path.isfile(src_sidecar):
+            os.rename(src_sidecar, dst_sidecar)
+
+
+def read_header(path, n_header):
+    """Header lines of a text table, from its sidecar if there is an up-to-date one."""
+    if sidecar_is_fresh(path):
+        path = sidecar_paths(path)[1]
+    with open(path, 'r') as f:
+        return [f.readline() for _ in range(n_header)]
+
+
+def read_table(path, n_header, mmap=True, usecols=None):
+    """
+    Header lines and data of a text table, from its sidecar if there is an up-to-date one.
+    With usecols (list of column indices), only these columns are returned (and parsed);
+    a single column index gives a 1D array.
+    """
+    sidecar = read_sidecar(path, mmap=mmap)
+    if sidecar is not None:
+        header_lines, data = sidecar
+        return header_lines, data if usecols is None else data[:, usecols]
+    with open(path, 'r') as f:
+        header_lines = [f.readline() for _ in range(n_header)]
+    ndmin = 1 if isinstance(usecols, (int, np.integer)) else 2
+    return header_lines, np.loadtxt(path, skiprows=n_header, usecols=usecols, ndmin=ndmin)
+
+
+def read_static_conc(path, mmap=True):
+    # the data block is read-only if it is memory-mapped from a sidecar
+    header_lines, data = read_table(path, 3, mmap=mmap)
+    first_line = header_lines[0]
+    dimension = np.array(header_lines[1].split(), dtype=int)
+    header = np.array(header_lines[2].split())
+    return StaticConc(first_line, dimension, header, data)
+
+
+def write_static_conc(path, conc):
+    dimension = np.array(conc.dimension)
+    dimension[3] = conc.data.shape[0] # number of layers
+    with open(path, 'w') as f:
+        f.write(conc.first_line)
+        f.write(''.join(f'{d:9d}' for d in dimension) + '\n')
+        f.write(''.join(f'{name:>20s}' for name in conc.header) + '\n')
+        for row in conc.data:
+            f.write(''.join(f'{value:20.12E}' for value in row) + '\n')
+
+
+def gas_columns(dimension):
+    # columns of el, elements and molecules (log10 densities)
+    n_elem, n_mol = dimension[0], dimension[1]
+    return slice(3, 4+n_elem+n_mol)
+
+
+def log_vmr(conc, names):
+    """log10 volume mixing ratios of the given gas species, shape (n_layers, len(names))."""
+    gas = conc.data[:, gas_columns(conc.dimension)]
+    log_ntot = np.log10(np.sum(10**gas, axis=1))
+    idx = [np.where(conc.header == name)[0][0] for name in names]
+    return conc.data[:, idx] - log_ntot[:, np.newaxis]
+
+
+def interpolate_static_conc(conc, P_new_bar, T_new=None):
+    """Interpolates all columns linearly in log(P) onto a new pressure grid [bar]."""
+    P_old = conc.data[:, 2]
+    order = np.argsort(P_old)
+    x_old = np.log10(P_old[order])
+    x_new = np.log10(np.asarray(P_new_bar) * 1e6)
+
+    data = np.empty((len(x_new), conc.data.shape[1]))
+    for j in range(conc.data.shape[1]):
+        column = conc.data[order, j]
+        if j == 1: # nHtot is not given as log10
+            data[:, j] = 10**np.interp(x_new, x_old, np.log10(column))
+        else:
+            data[:, j] = np.interp(x_new, x_old, column)
+    data[:, 2] = 10**x_new
+    if T_new is not None:
+        data[:, 0] = T_new
+    return StaticConc(conc.first_line, conc.dimension, conc.header, data)
@@ -0,0 +1,159 @@
+import numpy as np
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+
+from ggchem_io import read_static_conc, read_table, log_vmr
+from iterations import scan_iterations, n_consecutive
+
+# Summary table of per-run scalars of an output directory, saved as
+# <out_dir>/grid_summary.dat with one row per run:
+#   name signature n_iterations converged T_surf T_TOA escape_time_yrs P_RCB vmr_<species>...
+# (temperatures in K, escape time in years, RCB pressure in bar, surface VMRs).
+# coupled_driver.py appends the row of a run when it has finished; running this
+# script updates the rows of all runs whose output files changed (e.g. after
+# calc_escape.py) and drops runs that no longer exist. If a run appears more
+# than once, its last row is valid. Read it with analyze_modules.summary.
+#
+# Usage:
+#   python3 source/grid_summary.py output/grid
+
+SUMMARY_FILE = 'grid_summary.dat'
+
+summary_species = ['H2O', 'CH4', 'CO', 'CO2', 'H2', 'N2', 'NH3', 'O2']
+columns = ['name', 'signature', 'n_iterations', 'converged', 'T_surf', 'T_TOA', 'escape_time_yrs', 'P_RCB'] \
+    + [f'vmr_{s}' for s in summary_species]
+
+
+def run_signature(run_dir, name):
+    """Hash of the names, modification times and sizes of the outputs the row depends on."""
+    files = []
+    for entry in os.scandir(run_dir):
+        if entry.name.startswith(('Static_Conc_', 'vertical_mix_')) or entry.name in (f'{name}_tp.dat', 'escape.dat'):
+            stat = entry.stat()
+            files.append((entry.name, stat.st_mtime_ns, stat.st_size))
+    return hashlib.sha256(json.dumps(sorted(files)).encode()).hexdigest()[:16]
+
+
+def read_escape_time(run_dir):
+    # last line of escape.dat (see calc_escape.py)
+    try:
+        with open(os.path.join(run_dir, 'escape.dat'), 'r') as f:
+            return float(f.readlines()[-1].split()[-1])
+    except (FileNotFoundError, IndexError, ValueError):
+        return np.nan
+
+
+def rcb_pressure(P_bar, convective):
+    # first radiative layer above a convective one, as in analyze_modules.plot_rcb_height
+    rcb_index = np.where(np.diff(convective.astype(int)) == -1)[0]
+    if rcb_index.size == 0:
+        return np.nan
+    i = rcb_index[0]
+    return 10**((np.log10(P_bar[i]) + np.log10(P_bar[i+1])) / 2)
+
+
+def summarize_run(run_dir):
+    """Row of the summary table for one run directory."""
+    name = os.path.basename(os.path.normpath(run_dir))
+    row = {c: np.nan for c in columns}
+    row.update(name=name, signature=run_signature(run_dir, name), n_iterations=0, converged=0)
+
+    row['n_iterations'] = n_consecutive(scan_iterations(run_dir).static_conc)
+    if row['n_iterations'] == 0:
+        return row
+    row['escape_time_yrs'] = read_escape_time(run_dir)
+
+    try:
+        conc = read_static_conc(os.path.join(run_dir, f"Static_Conc_{row['n_iterations'] - 1}.dat"))
+    except (IndexError, ValueError): # empty or malformed output of a failed GGchem run
+        return row
+    if conc.data.shape[0] == 0:
+        return row
+    T, P = conc.data[:, 0], conc.data[:, 2]
+    # same criterion as ChelioRun: top pressure reached and no dummy profile of a failed HELIOS run
+    if P[-1] != 1e-1 or np.all(T == 1.001):
+        return row
+
+    row.update(converged=1, T_surf=T[0], T_TOA=T[-1])
+    species = [s for s in summary_species if s in conc.header]
+    if species:
+        vmr = 10**log_vmr(conc, species)[0]
+        row.update({f'vmr_{s}': v for s, v in zip(species, vmr)})
+
+    tp_path = os.path.join(run_dir, f'{name}_tp.dat')
+    if os.path.isfile(tp_path):
+        _, tp = read_table(tp_path, 2)
+        if tp.shape[0] == len(P) and tp.shape[1] > 6:
+            row['P_RCB'] = rcb_pressure(P * 1e-6, tp[:, 6])
+    return row
+
+
+def format_row(row):
+    values = [f'{row[c]}' if c in ('name', 'signature', 'n_iterations', 'converged') else f'{row[c]:.6e}' for c in columns]
+    return ' '.join(values) + '\n'
+
+
+def header_line():
+    return '# ' + ' '.join(columns) + '\n'
+
+
+def read_summary(out_dir):
+    """Rows of the summary table as a dictionary name -> row (strings)."""
+    rows = {}
+    try:
+        with open(os.path.join(out_dir, SUMMARY_FILE), 'r') as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return rows
+    for line in lines:
+        values = line.split()
+        if line.startswith('#') or len(values) != len(columns):
+            continue
+        rows[values[0]] = dict(zip(columns, values))
+    return rows
+
+
+def append_summary(run_dir):
+    """Appends the row of a finished run to the summary table of its output directory."""
+    out_dir = os.path.dirname(os.path.normpath(run_dir))
+    path = os.path.join(out_dir, SUMMARY_FILE)
+    line = format_row(summarize_run(run_dir))
+    # one write in append mode, so runs of a grid finishing at the same time do not mix their rows
+    with open(path, 'a') as f:
+        f.write((header_line() if f.tell() == 0 else '') + line)
+
+
+def update_summary(out_dir, verbose=False):
+    """Rewrites the summary table of out_dir, summarizing only runs whose outputs changed."""
+    old_rows = read_summary(out_dir)
+    lines = []
+    n_updated = 0
+    for entry in sorted(os.scandir(out_dir), key=lambda entry: entry.name):
+        if not (entry.is_dir() and os.path.isfile(os.path.join(entry.path, 'Static_Conc_0.dat'))):
+            continue
+        old = old_rows.get(entry.name)
+        if old is not None and old['signature'] == run_signature(entry.path, entry.name):
+            lines.append(' '.join(old[c] for c in columns) + '\n')
+        else:
+            lines.append(format_row(summarize_run(entry.path)))
+            n_updated += 1
+
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        f.write(header_line())
+        f.writelines(lines)
+    os.replace(tmp_path, os.path.join(out_dir, SUMMARY_FILE))
+    if verbose:
+        print(f'Summary of {out_dir}: {len(lines)} runs, {n_updated} updated.')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Update the summary table of per-run scalars of an output directory.')
+    parser.add_argument('out_dir', type=str, help='Output directory containing the run directories')
+    args = parser.parse_args()
+
+    update_summary(args.out_dir, verbose=True)
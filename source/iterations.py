@@ -0,0 +1,49 @@
+import os
+import re
+from collections import namedtuple
+
+# Discovery of the archived iterations of a run: Static_Conc_{i}.dat and
+# vertical_mix_{i}.dat, and the Static_Conc_{i}_bad.dat (vertical_mix_{i}_bad.dat)
+# of iterations marked by mark_bad_last_iters.py. The run directory is listed
+# once instead of probing one file name after the other, which is slow on
+# network file systems. All loaders use it, also analyze_modules (see
+# analyze_modules/iterations.py).
+
+pattern = re.compile(r'^(Static_Conc|vertical_mix)_(-?\d+)(_bad)?\.dat$')
+
+# sorted iteration numbers of each kind of file
+RunIterations = namedtuple('RunIterations', ['static_conc', 'static_conc_bad', 'vertical_mix', 'vertical_mix_bad'])
+
+
+def parse_iterations(file_names):
+    """Iterations of a run from the names of the files in its directory."""
+    found = {field: [] for field in RunIterations._fields}
+    for name in file_names:
+        match = pattern.match(name)
+        if match:
+            prefix, i, bad = match.groups()
+            found[prefix.lower() + ('_bad' if bad else '')].append(int(i))
+    return RunIterations(**{field: sorted(found[field]) for field in RunIterations._fields})
+
+
+def scan_iterations(run_dir):
+    """Iterations of the run in run_dir (one directory listing; none if it does not exist)."""
+    try:
+        names = os.listdir(run_dir)
+    except (FileNotFoundError, NotADirectoryError):
+        names = []
+    return parse_iterations(names)
+
+
+def n_consecutive(iterations):
+    """Number of consecutive iterations 0, 1, 2, ... (loaders stop at the first missing one)."""
+    present = set(iterations)
+    n = 0
+    while n in present:
+        n += 1
+    return n
+
+
+def last_iteration(iterations):
+    """Last of the consecutive iterations from 0, -1 if there is none."""
+    return n_consecutive(iterations) - 1
@@ -1,6 +1,9 @@
 import numpy as np
 import warnings
-import os
+
+from ggchem_io import read_table, rename_with_sidecar
+from iterations import scan_iterations, n_consecutive
+from create_pt import interpolate_profile
 
 # parameters
 params = np.array(['P0', 'Tint', 'CplusO', 'CtoO'])
@@ -30,48 +33,50 @@ def built_name(P0, Tint, CplusO, CtoO):
     return f'Earth_P0={format_e_nums(P0)}_Tint={Tint}_NoCond_CplusO={format_e_nums(CplusO)}_CtoO={format_CtoO_float(CtoO)}'
     
 def extract_data(i_P0=0, i_Tint=0, i_CplusO=0, i_CtoO=0):
-        
+    """
+    Iteration indices and RMS change of T(P) w.r.t. the previous iteration, computed while
+    reading the iterations one after the other (only the previous profile is kept; profiles
+    with different layer counts are interpolated instead of zero-padded).
+    """
     inds = []
-    PTs = []
+    diff = []
 
     name = built_name(P0s[i_P0], Tints[i_Tint], CplusOs[i_CplusO], CtoOs[i_CtoO])
 
     path = folder + name + "/Static_Conc_{var}.dat"
-    j = 0
-    max_nlay = 0
+    iterations = scan_iterations(folder + name) # one directory listing instead of probing each file
+    bad = set(iterations.static_conc_bad)
+    n_iter = n_consecutive(iterations.static_conc + iterations.static_conc_bad)
+    PT_old = None
 
-    while True:
+    for j in range(n_iter):
         with warnings.catch_warnings():
             warnings.simplefilter("error", UserWarning)
             try:
                 # if bad file exists
-                if os.path.isfile(path.format(var=f'{j}_bad')):
+                if j in bad:
                     # rename file
-                    os.rename(path.format(var=f'{j}_bad'), path.format(var=j))
-                d = np.loadtxt(path.format(var=j), skiprows=3)
-                max_nlay = max(max_nlay, d.shape[0])
-                PTs.append(np.array([d[:,2]*1e-6, d[:,0]]).T) # convert pressure from dyn/cm^2 to bar
+                    rename_with_sidecar(path.format(var=f'{j}_bad'), path.format(var=j))
+                _, d = read_table(path.format(var=j), 3)
+                P, T = d[:,2]*1e-6, np.array(d[:,0]) # convert pressure from dyn/cm^2 to bar
+                if PT_old is not None:
+                    # calc mean squared difference to the previous profile
+                    T_old = PT_old[1] if len(PT_old[0]) == len(P) else interpolate_profile(*PT_old, P)
+                    diff.append(np.sqrt(((T - T_old)**2).mean()))
+                PT_old = (P, T)
                 inds.append(j)
-                j += 1
             except (FileNotFoundError, UserWarning) as warn:
                 if warn.__class__ == UserWarning:
                     print(f'!GGchem did not converge for {name}!')
                 break
 
-    for i, pt in enumerate(PTs):
-        if pt.shape[0] < max_nlay:
-            PTs[i] = np.pad(pt, ((0, max_nlay - pt.shape[0]), (0, 0)), mode='constant', constant_values=0)
-
-    return name, np.array(inds), np.array(PTs)
+    return name, np.array(inds), np.array(diff)
 
 for i in range(len(P0s)):
     for j in range(len(Tints)):
         for k in range(len(CplusOs)):
             for l in range(len(CtoOs)):
-                name, inds, PTs = extract_data(i, j, k, l)
-
-                # calc mean squared difference between consecutive points
-                diff = np.sqrt((np.abs(PTs[1:,:,1] - PTs[:-1,:,1])**2).mean(axis=1))
+                name, inds, diff = extract_data(i, j, k, l)
 
                 for m in np.arange(len(diff)-1, 0, -1):
                     if diff[m] > 1.1*diff[m-1] and diff[m] > 1e0:
@@ -79,6 +84,6 @@ for i in range(len(P0s)):
                         print('Differences: ', diff)
                         
                         # Rename files
-                        os.rename(folder + name + f'/Static_Conc_{m}.dat', folder + name + f'/Static_Conc_{m}_bad.dat')
+                        rename_with_sidecar(folder + name + f'/Static_Conc_{m}.dat', folder + name + f'/Static_Conc_{m}_bad.dat')
                     else:
                         break
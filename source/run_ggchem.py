@@ -0,0 +1,395 @@
+import numpy as np
+
+import argparse
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from create_pt import read_pt, write_pt
+from ggchem_io import StaticConc, read_static_conc, write_static_conc
+
+# Chemistry step of the HELIOS-GGchem coupling.
+#
+# Runs GGchem (model_dim 1) on the P-T structure of a working directory
+# (layout as in coupled_driver.py) and leaves the result in
+# <work_dir>/Static_Conc.dat. With --shards K > 1 the structure is split into
+# K contiguous chunks of layers that are solved by K GGchem processes running
+# concurrently in <work_dir>/shard_<k>, and the pieces are merged again.
+#
+# With equilibrium condensation and remove_condensates, GGchem passes the gas
+# phase element abundances of each layer on to the next one (bottom to top),
+# so a chunk depends on the layers below it. Each chunk is therefore started
+# with the abundances (eps columns) of the layer below it where these are
+# known, otherwise with the input abundances. Afterwards the chain is checked,
+# and the chunks above the first inconsistent layer are solved again, starting
+# from the correct abundances. Without condensation no second round is needed.
+#
+# With --dT_threshold > 0 the step is incremental: the GGchem output of the
+# previous step (<work_dir>/Static_Conc.dat) is reused for all layers whose
+# temperature differs by less than the threshold from the temperature that
+# output was computed at (its Tg column, so small changes cannot accumulate
+# over iterations). Only the other layers are solved and spliced in.
+#
+# With --cache_dir, complete GGchem outputs are stored in a cache shared by
+# all runs, keyed by a hash of the abundances, the P-T structure, the GGchem
+# parameter file and the GGchem executable. On a hit the cached output is used
+# without running GGchem. The least recently used entries are removed when the
+# cache grows beyond --cache_size MB. Hits and misses are logged to
+# <cache_dir>/cache.log and to the statistics file.
+#
+# Usage (chemistry_step() is called by coupled_driver.py):
+#   python3 source/run_ggchem.py --work_dir <work_dir> --shards 4 --dT_threshold 1 \
+#       --cache_dir <dir> --stats_file <run_dir>/<NAME>_ggchem_steps.dat --step <i>
+#   python3 source/run_ggchem.py --summary <run_dir>/<NAME>_ggchem_steps.dat
+
+GGCHEM_PATH = os.environ.get('GGCHEM_PATH', '')
+
+eps_tolerance = 1e-6 # dex, element abundances treated as equal (GGchem output has 13 digits)
+
+stats_columns = ['step', 'n_layers', 'n_solved', 'n_skipped', 'n_shards', 'n_rounds', 'cache', 'wall_time[s]']
+
+
+def read_param(param_path):
+    """Names of the abundance and structure files and the condensation flags of a GGchem parameter file."""
+    with open(param_path, 'r') as f:
+        lines = [line.strip() for line in f]
+    param = {'abund_file': 'abund_helios.in', 'struc_file': 'pt_helios.in', 'chained': False}
+    flags = {}
+    for k, line in enumerate(lines):
+        if '!' in line:
+            value, key = line.split('!', 1)
+            flags[key.split()[0]] = value.strip()
+            if key.split()[0] == 'abund_pick' and k+1 < len(lines):
+                param['abund_file'] = lines[k+1].split()[0]
+            elif key.split()[0] == 'model_struc' and k+1 < len(lines):
+                param['struc_file'] = lines[k+1].split()[0]
+    param['chained'] = (flags.get('model_eqcond', '').lower() == '.true.'
+                        and flags.get('remove_condensates', '').lower() == '.true.')
+    return param
+
+
+def read_abundances(path):
+    # GGchem abundance file: element and 12 + log10(n_el/n_H) per line
+    abundances = []
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                element, value = line.split()[:2]
+                abundances.append((element, float(value)))
+    return abundances
+
+
+def write_abundances(path, abundances):
+    with open(path, 'w') as f:
+        for element, value in abundances:
+            f.write(f'{element}  {value:.10f}\n')
+
+
+def eps_columns(header):
+    """Elements and column indices of the eps<element> columns."""
+    elements, idx = [], []
+    for j, name in enumerate(header):
+        if name.startswith('eps'):
+            elements.append(name[3:])
+            idx.append(j)
+    return elements, np.array(idx, dtype=int)
+
+
+def relative_eps(conc_data, header):
+    """log10 element abundances relative to H per layer, shape (n_layers, n_eps)."""
+    elements, idx = eps_columns(header)
+    eps = conc_data[:, idx]
+    return eps - eps[:, [elements.index('H')]]
+
+
+def base_eps(abundances, header):
+    elements, _ = eps_columns(header)
+    values = dict(abundances)
+    return np.array([values.get(element, np.nan) - values['H'] for element in elements])
+
+
+def abundances_from_eps(abundances, header, eps_row):
+    """Input abundances for a layer that starts with the gas composition eps_row of the layer below."""
+    elements, _ = eps_columns(header)
+    eps = dict(zip(elements, eps_row))
+    return [(element, 12 + eps[element] if element in eps and np.isfinite(eps[element]) else value)
+            for element, value in abundances]
+
+
+def run_ggchem(work_dir):
+    """Runs GGchem in a working directory and returns its Static_Conc.dat."""
+    conc_path = os.path.join(work_dir, 'Static_Conc.dat')
+    if os.path.isfile(conc_path): # output of the previous step, must not pass for the new one
+        os.remove(conc_path)
+    result = subprocess.run([os.path.join(GGCHEM_PATH, 'ggchem'), 'input/param_helios.in'], cwd=work_dir,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if result.returncode != 0 or not os.path.isfile(conc_path):
+        print(result.stdout)
+        raise RuntimeError(f'GGchem failed in {work_dir} (exit code {result.returncode})')
+    return read_static_conc(conc_path)
+
+
+def prepare_shard(work_dir, shard_dir, param, P, T, abundances):
+    os.makedirs(os.path.join(shard_dir, 'input'), exist_ok=True)
+    os.makedirs(os.path.join(shard_dir, 'structures'), exist_ok=True)
+    if not os.path.islink(os.path.join(shard_dir, 'data')):
+        os.symlink(os.path.realpath(os.path.join(work_dir, 'data')), os.path.join(shard_dir, 'data'))
+    shutil.copy(os.path.join(work_dir, 'input', 'param_helios.in'), os.path.join(shard_dir, 'input', 'param_helios.in'))
+    write_pt(os.path.join(shard_dir, 'structures', param['struc_file']), P, T)
+    write_abundances(os.path.join(shard_dir, param['abund_file']), abundances)
+    conc_path = os.path.join(shard_dir, 'Static_Conc.dat')
+    if os.path.isfile(conc_path):
+        os.remove(conc_path)
+
+
+def split_blocks(layers, size, starts=(), contiguous=True):
+    """
+    Splits sorted layer indices into blocks of at most `size` layers, also starting
+    a new block at each layer in `starts`. With `contiguous`, blocks never span a gap.
+    """
+    blocks = []
+    cuts = np.isin(layers[1:], starts)
+    if contiguous:
+        cuts |= np.diff(layers) != 1
+    for run in np.split(layers, np.where(cuts)[0] + 1):
+        blocks += [run[k:k+size] for k in range(0, len(run), size)]
+    return blocks
+
+
+def solve_layers(work_dir, param, P, T, todo, abundances, shards=1, previous=None):
+    """
+    Solves the layers flagged in `todo` in parallel chunks and splices them into
+    `previous` (a StaticConc on the same grid, or None if all layers are solved).
+    Returns the merged StaticConc, the number of rounds and a mask of the solved layers.
+    """
+    n = len(P)
+    conc = previous
+    layer_input = None # abundances (rel. to H) each layer was started with, NaN: continued within a chunk
+    if previous is not None:
+        eps = relative_eps(previous.data, previous.header)
+        layer_input = np.vstack([base_eps(abundances, previous.header), eps[:-1]])
+
+    # Independent layers are distributed evenly over the chunks. Chained layers use
+    # fixed chunks of the whole grid, so that each round completes at least one chunk.
+    if param['chained']:
+        size = int(np.ceil(n / shards))
+        starts = np.arange(size, n, size)
+    else:
+        size = int(np.ceil(np.count_nonzero(todo) / shards))
+        starts = []
+    rounds = 0
+    solved = np.zeros(n, dtype=bool)
+    while todo.any():
+        rounds += 1
+        blocks = split_blocks(np.where(todo)[0], size, starts, contiguous=param['chained'])
+        jobs = []
+        for k, block in enumerate(blocks):
+            start = block[0]
+            block_abundances = abundances
+            if param['chained'] and start > 0 and conc is not None and np.all(np.isfinite(conc.data[start-1])):
+                block_abundances = abundances_from_eps(abundances, conc.header, relative_eps(conc.data[[start-1]], conc.header)[0])
+            shard_dir = os.path.join(work_dir, f'shard_{k}')
+            prepare_shard(work_dir, shard_dir, param, P[block], T[block], block_abundances)
+            jobs.append((block, block_abundances, shard_dir))
+
+        with ThreadPoolExecutor(max_workers=min(len(jobs), shards)) as pool:
+            results = list(pool.map(run_ggchem, [shard_dir for _, _, shard_dir in jobs]))
+
+        if conc is None:
+            first = results[0]
+            conc = StaticConc(first.first_line, first.dimension, first.header, np.full((n, first.data.shape[1]), np.nan))
+            layer_input = np.full((n, len(eps_columns(first.header)[0])), np.nan)
+        for (block, block_abundances, _), result in zip(jobs, results):
+            if not np.array_equal(result.header, conc.header) or result.data.shape[0] != len(block):
+                raise RuntimeError('GGchem output of a chunk does not match the other chunks')
+            conc.data[block] = result.data
+            solved[block] = True
+            layer_input[block] = np.nan
+            layer_input[block[0]] = base_eps(block_abundances, conc.header)
+
+        todo = np.zeros(n, dtype=bool)
+        if param['chained']:
+            # first layer whose input differs from the gas composition of the layer below
+            expected = np.vstack([base_eps(abundances, conc.header), relative_eps(conc.data[:-1], conc.header)])
+            with np.errstate(invalid='ignore'):
+                inconsistent = np.any(np.abs(expected - layer_input) > eps_tolerance, axis=1)
+            if inconsistent.any():
+                todo[np.argmax(inconsistent):] = True
+
+    return conc, rounds, solved
+
+
+def cache_key(work_dir, param):
+    """Hash of everything the GGchem output depends on."""
+    h = hashlib.sha256()
+    for path in [os.path.join(work_dir, param['abund_file']),
+                 os.path.join(work_dir, 'structures', param['struc_file']),
+                 os.path.join(work_dir, 'input', 'param_helios.in')]:
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    executable = os.stat(os.path.join(GGCHEM_PATH, 'ggchem')) # a rebuilt GGchem invalidates the cache
+    h.update(f'{executable.st_size} {executable.st_mtime_ns}'.encode())
+    return h.hexdigest()
+
+
+def cache_fetch(cache_dir, key, conc_path):
+    """Copies a cached output to conc_path. Returns True on a hit."""
+    entry = os.path.join(cache_dir, f'{key}.dat')
+    try:
+        shutil.copy(entry, conc_path + '.tmp')
+        os.utime(entry) # the modification time orders the entries for LRU eviction
+    except FileNotFoundError: # also if another run evicted it in the meantime
+        return False
+    os.replace(conc_path + '.tmp', conc_path)
+    return True
+
+
+def cache_store(cache_dir, key, conc_path, max_size):
+    """Adds an output to the cache and evicts the least recently used entries beyond max_size [MB]."""
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    os.close(fd)
+    shutil.copy(conc_path, tmp_path)
+    os.replace(tmp_path, os.path.join(cache_dir, f'{key}.dat')) # atomic, runs may share the cache
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith('.dat'):
+            try:
+                stat = os.stat(os.path.join(cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in entries:
+        if total <= max_size * 1e6:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def cache_log(cache_dir, event, key, work_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, 'cache.log'), 'a') as f:
+        f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {event:<5} {key[:16]} {os.path.basename(os.path.normpath(work_dir))}\n")
+
+
+def append_stats(path, row):
+    new_file = not os.path.isfile(path)
+    with open(path, 'a') as f:
+        if new_file:
+            f.write(''.join(f'{c:<16}' for c in stats_columns).rstrip() + '\n')
+        f.write(''.join(f'{v:<16}' for v in row).rstrip() + '\n')
+
+
+def previous_output(conc_path, P):
+    """GGchem output of the previous step if it exists and is on the pressure grid P [bar], else None."""
+    if not os.path.isfile(conc_path):
+        return None
+    previous = read_static_conc(conc_path)
+    if previous.data.shape[0] != len(P) or not np.allclose(previous.data[:, 2] * 1e-6, P, rtol=1e-5):
+        return None
+    if not np.all(np.isfinite(previous.data[:, :3])):
+        return None
+    return previous
+
+
+def chemistry_step(work_dir, shards=1, dT_threshold=0, cache_dir=None, cache_size=1000, stats_file=None, step=0):
+    """Runs GGchem on the structure of `work_dir` and writes <work_dir>/Static_Conc.dat."""
+    start = time.time()
+    param = read_param(os.path.join(work_dir, 'input', 'param_helios.in'))
+    P, T = read_pt(os.path.join(work_dir, 'structures', param['struc_file']))
+    n = len(P)
+    shards = max(1, min(shards, n))
+    conc_path = os.path.join(work_dir, 'Static_Conc.dat')
+
+    cache = '-'
+    if cache_dir is not None:
+        key = cache_key(work_dir, param)
+        cache = 'hit' if cache_fetch(cache_dir, key, conc_path) else 'miss'
+        cache_log(cache_dir, cache, key, work_dir)
+
+    previous = None
+    todo = np.ones(n, dtype=bool)
+    if cache == 'hit':
+        todo[:] = False
+    elif dT_threshold > 0:
+        previous = previous_output(conc_path, P)
+        if previous is not None:
+            todo = np.abs(T - previous.data[:, 0]) > dT_threshold
+        else:
+            print('GGchem: no previous output on this pressure grid, solving all layers')
+
+    n_solved = np.count_nonzero(todo)
+    rounds = 0
+    if cache == 'hit':
+        pass
+    elif previous is None and shards == 1:
+        run_ggchem(work_dir)
+        rounds = 1
+    elif n_solved > 0:
+        abundances = read_abundances(os.path.join(work_dir, param['abund_file']))
+        conc, rounds, solved = solve_layers(work_dir, param, P, T, todo, abundances, shards=shards, previous=previous)
+        n_solved = np.count_nonzero(solved) # including layers solved again to restore the abundance chain
+        write_static_conc(conc_path, conc)
+
+    # only complete solutions are cached, not those with reused layers
+    if cache == 'miss' and n_solved == n:
+        cache_store(cache_dir, key, conc_path, cache_size)
+
+    wall_time = time.time() - start
+    n_skipped = n - n_solved
+    if cache == 'hit':
+        print(f'GGchem: cache hit ({key[:16]}), {n} layers reused, {wall_time:.1f} s')
+    elif previous is not None:
+        print(f'GGchem: solved {n_solved} of {n} layers, skipped {n_skipped} ({100 * n_skipped / n:.0f}%) '
+              f'with |dT| <= {dT_threshold} K, {rounds} round(s), {wall_time:.1f} s')
+    else:
+        print(f'GGchem: {n} layers in {shards} chunk(s), {rounds} round(s), {wall_time:.1f} s')
+    if stats_file is not None:
+        append_stats(stats_file, [step, n, n_solved, n_skipped, shards, rounds, cache, f'{wall_time:.2f}'])
+
+
+def print_summary(stats_file):
+    """Totals of the GGchem steps of a run."""
+    with open(stats_file, 'r') as f:
+        columns = f.readline().split()
+        rows = [dict(zip(columns, line.split())) for line in f if line.strip()]
+    n_layers = sum(int(row['n_layers']) for row in rows)
+    n_skipped = sum(int(row['n_skipped']) for row in rows)
+    hits = sum(row.get('cache') == 'hit' for row in rows)
+    misses = sum(row.get('cache') == 'miss' for row in rows)
+    wall_time = sum(float(row['wall_time[s]']) for row in rows)
+    print(f'GGchem: {len(rows)} steps, {n_layers - n_skipped} of {n_layers} layers solved '
+          f'({n_skipped} skipped), cache {hits} hit(s) / {misses} miss(es), {wall_time:.1f} s in total')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the GGchem step of the coupling in a working directory.')
+    parser.add_argument('--work_dir', type=str, default=None, help='Working directory (see coupled_driver.py)')
+    parser.add_argument('--shards', type=int, default=1, help='Number of GGchem processes solving contiguous chunks of layers')
+    parser.add_argument('--dT_threshold', type=float, default=0, help='Reuse the previous output for layers with |dT| below this value [K] (0: solve all layers)')
+    parser.add_argument('--cache_dir', type=str, default=None, help='Directory of the GGchem output cache (disabled if not given)')
+    parser.add_argument('--cache_size', type=float, default=1000, help='Maximum size of the cache [MB]')
+    parser.add_argument('--summary', type=str, default=None, help='Only print the totals of a statistics file')
+    parser.add_argument('--stats_file', type=str, default=None, help='File to which statistics of the step are appended')
+    parser.add_argument('--step', type=int, default=0, help='Coupling iteration (for the statistics)')
+
+    args = parser.parse_args()
+
+    if args.summary is not None:
+        print_summary(args.summary)
+    elif args.work_dir is None:
+        parser.error('--work_dir is required')
+    else:
+        chemistry_step(args.work_dir, shards=args.shards, dT_threshold=args.dT_threshold,
+                       cache_dir=args.cache_dir, cache_size=args.cache_size,
+                       stats_file=args.stats_file, step=args.step)
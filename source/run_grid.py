@@ -0,0 +1,249 @@
+import numpy as np
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+# Runs a grid of coupled HELIOS-GGchem simulations on a bounded pool of
+# workers. Every run uses its own working directory, so several runs can
+# share one machine. Each worker is a long-lived Python process that runs
+# its simulations with coupled_driver.py; with --subprocess every simulation
+# is started as run_coupled.bash instead.
+#
+# Usage:
+#   python3 source/run_grid.py --BOA_P 1e6 1e7 1e8 --TEMP 50 100 150 \
+#       --CplusO 1e-3 1e-2 --CtoO 0.1 0.59 1.0 --OUT_DIR output/grid --workers 8
+#   python3 source/run_grid.py --grid_spec grid.json
+#
+# A grid spec file is a JSON dictionary with the same keys as the command line
+# options, e.g. {"BOA_P": ["1e6", "1e7"], "TEMP": [100, 200], "workers": 8}.
+# Parameter values are used as given in the run names, so non-integer values
+# must be strings ("1e6", not 1e6, which JSON reads as 1000000.0).
+#
+# With --warm_start, each run starts from the P-T profile of the closest run in
+# OUT_DIR that has already converged (see warm_start.py).
+
+CHELIO_PATH = os.environ.get('CHELIO_PATH', os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+MIXFILE = 'vertical_mix' # Base name for mixing ratio files (as in coupled_driver.py)
+
+# grid parameters: option name -> (tag in run name, default value)
+# Parameters with tag None are not part of the run name.
+grid_params = {
+    'BOA_P': ('P0', '1e6'),
+    'TEMP': ('Tint', '200'),
+    'CplusO': ('CplusO', '1e-3'),
+    'CtoO': ('CtoO', '0.59'),
+    'a_N': ('aN', None),
+    'ALBEDO': ('A', None),
+    'TOA_P': (None, '1e-1'),
+}
+
+log_lock = threading.Lock()
+
+
+def log(message, log_file=None):
+    line = f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {message}"
+    with log_lock:
+        print(line, flush=True)
+        if log_file is not None:
+            with open(log_file, 'a') as f:
+                f.write(line + '\n')
+
+
+def build_name(job, planet='Earth'):
+    # Same naming scheme as multiple_runs.bash: raw parameter strings
+    name = planet
+    for key, (tag, _) in grid_params.items():
+        if tag is not None and key in job:
+            name += f'_{tag}={job[key]}'
+    return name
+
+
+def estimate_cost(job):
+    # Run time scales with the number of layers (see create_pt.py)
+    Pmin = float(job.get('TOA_P', grid_params['TOA_P'][1]))
+    Pmax = float(job.get('BOA_P', grid_params['BOA_P'][1]))
+    return int(np.ceil(10.5 * np.log10(Pmax / Pmin)) + 1)
+
+
+def build_jobs(values, planet='Earth', order='longest'):
+    """Returns a list of job dictionaries (parameter strings plus 'NAME')."""
+    keys = [key for key in grid_params if values.get(key)]
+    jobs = []
+    for combination in itertools.product(*[values[key] for key in keys]):
+        job = dict(zip(keys, [str(v) for v in combination]))
+        job['NAME'] = build_name(job, planet)
+        jobs.append(job)
+
+    if order == 'longest':
+        # stable sort: longest runs first, otherwise keep grid order
+        jobs.sort(key=estimate_cost, reverse=True)
+    return jobs
+
+
+def is_done(out_dir, job, i_min=0):
+    # Same check as coupled_driver.py uses to skip existing runs
+    return os.path.isfile(os.path.join(CHELIO_PATH, out_dir, job['NAME'], f'{MIXFILE}_{i_min+1}.dat'))
+
+
+def coupled_args(job, out_dir, i_min=0, extra_args=()):
+    # options of run_coupled.bash / coupled_driver.py for one job
+    args = []
+    for key in grid_params:
+        if key in job:
+            args += [f'--{key}', job[key]]
+    args += ['--i_min', str(i_min), '--OUT_DIR', out_dir, '--NAME', job['NAME']]
+    return args + list(extra_args)
+
+
+def finish_job(job, out_dir, i_min, returncode, wall_time, log_file):
+    if returncode != 0:
+        status = 'FAILED'
+    elif is_done(out_dir, job, i_min):
+        status = 'DONE'
+    else:
+        status = 'NO_OUTPUT'
+    log(f"{status:<8} {job['NAME']} ({wall_time:.1f} s, exit code {returncode})", log_file)
+    return status, wall_time
+
+
+def run_job(job, out_dir, i_min=0, extra_args=(), log_file=None):
+    """Runs run_coupled.bash for one job. Returns (status, wall time in s)."""
+    run_dir = os.path.join(CHELIO_PATH, out_dir, job['NAME'])
+    os.makedirs(run_dir, exist_ok=True)
+
+    command = ['bash', os.path.join(CHELIO_PATH, 'run_coupled.bash')] + coupled_args(job, out_dir, i_min, extra_args)
+    env = dict(os.environ, CHELIO_PATH=CHELIO_PATH)
+
+    log(f"START    {job['NAME']}", log_file)
+    start = time.time()
+    with open(os.path.join(run_dir, 'run_coupled.log'), 'w') as out:
+        process = subprocess.run(command, cwd=CHELIO_PATH, env=env, stdout=out, stderr=subprocess.STDOUT)
+    return finish_job(job, out_dir, i_min, process.returncode, time.time() - start, log_file)
+
+
+def run_job_in_process(job, out_dir, i_min=0, extra_args=(), log_file=None):
+    """Runs one job with coupled_driver.py in the calling worker process. Returns (status, wall time in s)."""
+    from coupled_driver import parse_options, run_coupled
+
+    run_dir = os.path.join(CHELIO_PATH, out_dir, job['NAME'])
+    os.makedirs(run_dir, exist_ok=True)
+
+    log(f"START    {job['NAME']}", log_file)
+    start = time.time()
+    with open(os.path.join(run_dir, 'run_coupled.log'), 'w') as out, \
+         contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+        try:
+            run_coupled(parse_options(coupled_args(job, out_dir, i_min, extra_args)))
+            returncode = 0
+        except SystemExit as e: # invalid options
+            returncode = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            returncode = 1
+    return finish_job(job, out_dir, i_min, returncode, time.time() - start, log_file)
+
+
+def run_grid(jobs, out_dir, workers=1, i_min=0, extra_args=(), in_process=True):
+    """Runs all jobs on a pool of `workers` concurrent simulations."""
+    os.makedirs(os.path.join(CHELIO_PATH, out_dir), exist_ok=True)
+    log_file = os.path.join(CHELIO_PATH, out_dir, 'grid_runner.log')
+
+    todo = []
+    statuses = {}
+    for job in jobs:
+        if is_done(out_dir, job, i_min):
+            log(f"SKIPPED  {job['NAME']} (output already exists)", log_file)
+            statuses[job['NAME']] = ('SKIPPED', 0.0)
+        else:
+            todo.append(job)
+
+    log(f"Running {len(todo)} of {len(jobs)} simulations with {workers} worker(s)", log_file)
+    start = time.time()
+    # worker processes run many simulations each; threads only wait for run_coupled.bash
+    executor, run = (ProcessPoolExecutor, run_job_in_process) if in_process else (ThreadPoolExecutor, run_job)
+    with executor(max_workers=workers) as pool:
+        futures = {pool.submit(run, job, out_dir, i_min, extra_args, log_file): job for job in todo}
+        try:
+            for future in as_completed(futures):
+                statuses[futures[future]['NAME']] = future.result()
+        except KeyboardInterrupt:
+            log('Interrupted, cancelling queued simulations ...', log_file)
+            for future in futures:
+                future.cancel()
+            raise
+
+    counts = {}
+    for status, _ in statuses.values():
+        counts[status] = counts.get(status, 0) + 1
+    summary = ', '.join(f'{n} {status.lower()}' for status, n in sorted(counts.items()))
+    log(f"Grid finished in {time.time() - start:.1f} s: {summary}", log_file)
+    return statuses
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a grid of coupled HELIOS-GGchem simulations in parallel.')
+    for key, (_, default) in grid_params.items():
+        parser.add_argument(f'--{key}', nargs='+', default=None, help=f'Values of {key} (default: {default})')
+    parser.add_argument('--grid_spec', type=str, default=None, help='JSON file with parameter lists (overridden by command line options)')
+    parser.add_argument('--OUT_DIR', type=str, default=None, help='Output directory relative to CHELIO_PATH (default: output)')
+    parser.add_argument('--planet', type=str, default=None, help='Planet name used as run name prefix (default: Earth)')
+    parser.add_argument('--workers', type=int, default=None, help='Number of simulations run at the same time (default: 1)')
+    parser.add_argument('--order', choices=['longest', 'given'], default='longest', help='Job order: longest runs first, or grid order')
+    parser.add_argument('--i_min', type=int, default=0, help='Starting coupling iteration index')
+    parser.add_argument('--warm_start', action='store_true', help='Seed each run from the closest converged run in OUT_DIR')
+    parser.add_argument('--subprocess', action='store_true', help='Start every simulation as run_coupled.bash instead of in worker processes')
+    parser.add_argument('--seed_mixfile', action='store_true', help='With --warm_start, also seed the initial chemistry')
+
+    args, extra_args = parser.parse_known_args()
+
+    spec = {}
+    if args.grid_spec is not None:
+        with open(args.grid_spec, 'r') as f:
+            spec = json.load(f)
+
+    values = {}
+    for key, (_, default) in grid_params.items():
+        value = getattr(args, key)
+        if value is None:
+            value = spec.get(key)
+            for v in (value if isinstance(value, list) else [value]):
+                if isinstance(v, (float, bool)):
+                    print(f'Error: value {v!r} of {key} in {args.grid_spec} must be a string (e.g. "1e6"), '
+                          f'it is used as is in the run names.')
+                    sys.exit(1)
+        if value is None and default is not None:
+            value = [default]
+        if value is not None:
+            values[key] = value if isinstance(value, list) else [value]
+
+    out_dir = args.OUT_DIR or spec.get('OUT_DIR', 'output')
+    planet = args.planet or spec.get('planet', 'Earth')
+    workers = args.workers or spec.get('workers', 1)
+
+    if args.warm_start or spec.get('warm_start', False):
+        extra_args += ['--WARM_START', out_dir]
+        if args.seed_mixfile or spec.get('seed_mixfile', False):
+            extra_args += ['--SEED_MIXFILE', 'yes']
+
+    for variable in ['GGCHEM_PATH', 'HELIOS_PATH']:
+        if not os.environ.get(variable):
+            print(f'Error: {variable} environment variable is not set.')
+            sys.exit(1)
+    os.environ['CHELIO_PATH'] = CHELIO_PATH
+
+    jobs = build_jobs(values, planet=planet, order=args.order)
+    statuses = run_grid(jobs, out_dir, workers=workers, i_min=args.i_min, extra_args=extra_args,
+                        in_process=not (args.subprocess or spec.get('subprocess', False)))
+
+    if any(status == 'FAILED' for status, _ in statuses.values()):
+        sys.exit(1)
@@ -0,0 +1,160 @@
+import numpy as np
+
+import argparse
+import glob
+import os
+import re
+import sys
+
+from create_pt import pressure_grid, read_pt, interpolate_profile, write_pt
+from ggchem_io import read_static_conc, write_static_conc, interpolate_static_conc
+from iterations import scan_iterations
+
+# Seeds a new run with the converged P-T profile (and optionally the chemistry)
+# of the closest already converged run in (P0, Tint, C+O, C/O) space.
+# Distances are measured in dex, i.e. in log10 of all four parameters.
+#
+# Usage:
+#   python3 source/warm_start.py --search_dir output/grid --BOA_P 1e7 --TEMP 150 \
+#       --CplusO 1e-2 --CtoO 0.59 --out_pt <work_dir>/structures/pt_helios.in \
+#       [--out_conc <work_dir>/Static_Conc.dat]
+# Exit code 0 if the run was seeded, 2 if no converged neighbour was found.
+
+NO_NEIGHBOUR = 2
+
+# run parameter -> tag in run names (e.g. Earth_P0=1e7_Tint=100_CplusO=1e-2_CtoO=0.59)
+name_tags = {'BOA_P': 'P0', 'TEMP': 'Tint', 'CplusO': 'CplusO', 'CtoO': 'CtoO'}
+
+
+def read_run_params(run_dir):
+    """Parameters of a run from its run_params.dat, or else parsed from the directory name."""
+    params = {}
+    params_file = os.path.join(run_dir, 'run_params.dat')
+    if os.path.isfile(params_file):
+        with open(params_file, 'r') as f:
+            for line in f:
+                if line.strip():
+                    key, value = line.split()[:2]
+                    params[key] = value
+    else:
+        # token by token, like analyze_modules.catalog.parse_run_name (tags such as P0 contain digits)
+        tags = dict(token.split('=', 1) for token in os.path.basename(os.path.normpath(run_dir)).split('_') if '=' in token)
+        for key, tag in name_tags.items():
+            if tag in tags:
+                params[key] = tags[tag]
+
+    try:
+        return {key: float(params[key]) for key in name_tags}
+    except (KeyError, ValueError):
+        return None
+
+
+def coordinates(params):
+    CplusO = params['CplusO']
+    if CplusO < 0:
+        CplusO = 1 - abs(CplusO) # same convention as calc_abundances.py
+    return np.log10([params['BOA_P'], params['TEMP'], CplusO, params['CtoO']])
+
+
+def last_converged_profile(run_dir):
+    """
+    Path to the last *_tp_coupling_{i}.dat of a converged run, or None. A run has
+    converged if HELIOS ({NAME}_coupling_convergence.dat) or the Chelio convergence
+    monitor ({NAME}_chelio_converged.dat, see coupled_driver.py) says so.
+    """
+    name = os.path.basename(os.path.normpath(run_dir))
+    converged = False
+    for marker in [f'{name}_coupling_convergence.dat', f'{name}_chelio_converged.dat']:
+        marker_path = os.path.join(run_dir, marker)
+        if os.path.isfile(marker_path):
+            with open(marker_path, 'r') as f:
+                converged = converged or f.read().strip() == '1'
+    if not converged:
+        return None
+
+    iterations = []
+    for path in glob.glob(os.path.join(run_dir, f'{glob.escape(name)}_tp_coupling_*.dat')):
+        match = re.fullmatch(re.escape(name) + r'_tp_coupling_(-?\d+)\.dat', os.path.basename(path))
+        if match:
+            iterations.append(int(match.group(1)))
+    if not iterations:
+        return None
+
+    path = os.path.join(run_dir, f'{name}_tp_coupling_{max(iterations)}.dat')
+    _, T = read_pt(path)
+    if np.all(T == 1.001): # dummy profile of a failed HELIOS run
+        return None
+    return path
+
+
+def find_neighbour(search_dir, params, exclude=None):
+    """Returns (run_dir, distance) of the closest converged run, or (None, inf)."""
+    target = coordinates(params)
+    best, best_distance = None, np.inf
+    for run_dir in sorted(glob.glob(os.path.join(search_dir, '*', ''))):
+        run_dir = os.path.normpath(run_dir)
+        if exclude is not None and os.path.basename(run_dir) == exclude:
+            continue
+        run_params = read_run_params(run_dir)
+        if run_params is None:
+            continue
+        distance = np.linalg.norm(coordinates(run_params) - target)
+        if distance < best_distance and last_converged_profile(run_dir) is not None:
+            best, best_distance = run_dir, distance
+    return best, best_distance
+
+
+def last_static_conc(run_dir):
+    iterations = scan_iterations(run_dir).static_conc
+    if not iterations:
+        return None
+    return os.path.join(run_dir, f'Static_Conc_{max(iterations)}.dat')
+
+
+def seed_run(search_dir, params, TOA_P, BOA_P, out_pt, out_conc=None, exclude=None, coarse_factor=1):
+    """
+    Writes the initial P-T profile (and optionally the chemistry) of a new run with
+    the given parameters from the closest converged run. Returns False if there is none.
+    TOA_P and BOA_P in 1e-6 bar.
+    """
+    neighbour, distance = find_neighbour(search_dir, params, exclude=exclude)
+    if neighbour is None:
+        print('Warm start: no converged run found in', search_dir)
+        return False
+
+    print(f'Warm start from {os.path.basename(neighbour)} (distance {distance:.3f} dex)')
+
+    P = pressure_grid(TOA_P * 1e-6, BOA_P * 1e-6, coarse_factor)
+    T = interpolate_profile(*read_pt(last_converged_profile(neighbour)), P)
+    write_pt(out_pt, P, T)
+
+    if out_conc is not None:
+        conc_path = last_static_conc(neighbour)
+        if conc_path is None:
+            print('Warm start: no Static_Conc file found, GGchem will be run instead')
+        else:
+            conc = interpolate_static_conc(read_static_conc(conc_path), P, T_new=T)
+            write_static_conc(out_conc, conc)
+            print(f'Warm start: seeded chemistry from {os.path.basename(conc_path)}')
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Seed a run from the closest converged run.')
+    parser.add_argument('--search_dir', type=str, required=True, help='Directory containing converged runs')
+    parser.add_argument('--TOA_P', type=float, default=1e-1, help='Top of Atmosphere Pressure [1e-6 bar]')
+    parser.add_argument('--BOA_P', type=float, default=1e6, help='Bottom of Atmosphere Pressure [1e-6 bar]')
+    parser.add_argument('--TEMP', type=float, default=200, help='Internal Temperature [K]')
+    parser.add_argument('--CplusO', type=float, default=1e-3, help='C+O abundance')
+    parser.add_argument('--CtoO', type=float, default=0.59, help='C/O ratio')
+    parser.add_argument('--coarse_factor', type=float, default=1, help='Layer grid coarsening factor of the new run (see create_pt.py)')
+    parser.add_argument('--exclude', type=str, default=None, help='Name of a run to ignore (usually the new run itself)')
+    parser.add_argument('--out_pt', type=str, required=True, help='Output P-T file on the new pressure grid')
+    parser.add_argument('--out_conc', type=str, default=None, help='If given, also write the interpolated Static_Conc.dat of the neighbour')
+
+    args = parser.parse_args()
+
+    params = {'BOA_P': args.BOA_P, 'TEMP': args.TEMP, 'CplusO': args.CplusO, 'CtoO': args.CtoO}
+    if not seed_run(args.search_dir, params, args.TOA_P, args.BOA_P, args.out_pt, out_conc=args.out_conc,
+                    exclude=args.exclude, coarse_factor=args.coarse_factor):
+        sys.exit(NO_NEIGHBOUR)
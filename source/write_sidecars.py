@@ -0,0 +1,62 @@
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ggchem_io import sidecar_is_fresh, write_sidecar
+
+# Writes the binary sidecars (see ggchem_io.py) of the archived outputs of all
+# runs below an output directory, e.g. for runs made before the coupling wrote
+# them. Files that already have an up-to-date sidecar are skipped.
+#
+# Usage:
+#   python3 source/write_sidecars.py output/grid --workers 8
+
+# text outputs with a sidecar and their number of header lines
+patterns = [
+    (re.compile(r'^Static_Conc_-?\d+(_bad)?\.dat$'), 3),
+    (re.compile(r'^vertical_mix_-?\d+(_bad)?\.dat$'), 1),
+]
+
+
+def find_outputs(out_dir):
+    """(path, number of header lines) of all archived outputs below out_dir."""
+    outputs = []
+    for root, _, files in os.walk(out_dir):
+        for f in sorted(files):
+            for pattern, n_header in patterns:
+                if pattern.match(f):
+                    outputs.append((os.path.join(root, f), n_header))
+    return outputs
+
+
+def _write(output):
+    write_sidecar(*output)
+
+
+def write_tree(out_dir, workers=1, force=False):
+    outputs = find_outputs(out_dir)
+    todo = [output for output in outputs if force or not sidecar_is_fresh(output[0])]
+    print(f'Found {len(outputs)} output files in {out_dir}, {len(outputs) - len(todo)} with up-to-date sidecars.')
+
+    start = time.time()
+    if workers > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(_write, todo, chunksize=max(1, len(todo) // (4*workers))))
+    else:
+        for output in todo:
+            _write(output)
+    print(f'Wrote {len(todo)} sidecars in {time.time() - start:.2f} s.')
+    return len(todo)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write binary sidecars of the Static_Conc/vertical_mix outputs of all runs in a directory.')
+    parser.add_argument('out_dir', type=str, help='Output directory (searched recursively)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of parallel processes')
+    parser.add_argument('--force', action='store_true', help='Also rewrite up-to-date sidecars')
+
+    args = parser.parse_args()
+
+    write_tree(args.out_dir, workers=args.workers, force=args.force)